@@ -14,7 +14,8 @@ def cloud_function_handler(request):
     Google Cloud Function handler
     
     Args:
-        request: Flask request object (can contain JSON with 'date' key)
+        request: Flask request object (can contain JSON with 'date' key, or
+                 'start_date' and 'end_date' keys for a backfill range)
     
     Returns:
         dict: Response with status and results
@@ -22,15 +23,23 @@ def cloud_function_handler(request):
     try:
         # Extract target date from request if provided
         target_date = None
+        start_date = None
+        end_date = None
         if request and hasattr(request, 'get_json'):
             json_data = request.get_json(silent=True)
             if json_data and 'date' in json_data:
                 target_date = json_data['date']
+            if json_data:
+                start_date = json_data.get('start_date')
+                end_date = json_data.get('end_date')
         
-        logger.info(f"Cloud Function invoked for date: {target_date or 'yesterday'}")
+        if start_date or end_date:
+            logger.info(f"Cloud Function invoked for date range: {start_date} to {end_date}")
+        else:
+            logger.info(f"Cloud Function invoked for date: {target_date or 'yesterday'}")
         
         # Run the main automation
-        main(target_date=target_date)
+        main(target_date=target_date, start_date=start_date, end_date=end_date)
         
         return {
             'status': 'success',
@@ -13,10 +13,125 @@ SOCRATA_DOMAIN = os.getenv("SOCRATA_DOMAIN", "data.transportation.gov")
 SOCRATA_DATASET_ID = os.getenv("SOCRATA_DATASET_ID", "az4n-8mr2")  # FMCSA Company Census File
 SOCRATA_APP_TOKEN = os.getenv("SOCRATA_APP_TOKEN", "")
 
+# Page size for Socrata pagination - must be a positive number
+try:
+    SOCRATA_PAGE_SIZE = int(os.getenv("SOCRATA_PAGE_SIZE", "50000"))
+    if SOCRATA_PAGE_SIZE <= 0:
+        raise ValueError("SOCRATA_PAGE_SIZE must be positive")
+except (ValueError, TypeError):
+    SOCRATA_PAGE_SIZE = 50000  # Socrata default limit
+
+# Number of pages fetched in parallel (1 = sequential paging)
+try:
+    SOCRATA_FETCH_CONCURRENCY = int(os.getenv("SOCRATA_FETCH_CONCURRENCY", "1"))
+    if SOCRATA_FETCH_CONCURRENCY <= 0:
+        raise ValueError("SOCRATA_FETCH_CONCURRENCY must be positive")
+except (ValueError, TypeError):
+    SOCRATA_FETCH_CONCURRENCY = 1
+
+# Per-page retries with jittered exponential backoff (honours Retry-After)
+try:
+    SOCRATA_MAX_RETRIES = int(os.getenv("SOCRATA_MAX_RETRIES", "5"))
+    if SOCRATA_MAX_RETRIES < 0:
+        raise ValueError("SOCRATA_MAX_RETRIES must not be negative")
+except (ValueError, TypeError):
+    SOCRATA_MAX_RETRIES = 5
+
+try:
+    SOCRATA_BACKOFF_BASE_SECONDS = float(os.getenv("SOCRATA_BACKOFF_BASE_SECONDS", "1"))
+    SOCRATA_BACKOFF_MAX_SECONDS = float(os.getenv("SOCRATA_BACKOFF_MAX_SECONDS", "60"))
+    if SOCRATA_BACKOFF_BASE_SECONDS <= 0 or SOCRATA_BACKOFF_MAX_SECONDS <= 0:
+        raise ValueError("Backoff settings must be positive")
+except (ValueError, TypeError):
+    SOCRATA_BACKOFF_BASE_SECONDS = 1.0
+    SOCRATA_BACKOFF_MAX_SECONDS = 60.0
+
+# Client-side request rate limit used when no SOCRATA_APP_TOKEN is set
+try:
+    SOCRATA_UNAUTHENTICATED_RATE = float(os.getenv("SOCRATA_UNAUTHENTICATED_RATE", "1"))
+    if SOCRATA_UNAUTHENTICATED_RATE <= 0:
+        raise ValueError("SOCRATA_UNAUTHENTICATED_RATE must be positive")
+except (ValueError, TypeError):
+    SOCRATA_UNAUTHENTICATED_RATE = 1.0  # Default: 1 request per second
+
+# Pagination strategy: "offset" ($offset paging) or "keyset" (dot_number > last seen)
+SOCRATA_PAGINATION = os.getenv("SOCRATA_PAGINATION", "offset").lower()
+if SOCRATA_PAGINATION not in ("offset", "keyset"):
+    SOCRATA_PAGINATION = "offset"
+
+# Extra dataset columns to request on top of REQUIRED_FIELDS (comma separated).
+# Use "*" to disable the server-side projection and fetch every column.
+SOCRATA_EXTRA_FIELDS = [
+    field.strip() for field in os.getenv("SOCRATA_EXTRA_FIELDS", "").split(",") if field.strip()
+]
+
+# Output sinks receiving each day's leads, comma separated, first is primary
+# (its URL and new-record counts are reported): google_sheets, sqlite, local_file
+OUTPUT_SINKS = [
+    sink.strip().lower() for sink in os.getenv("OUTPUT_SINKS", "google_sheets").split(",") if sink.strip()
+] or ["google_sheets"]
+
 # Google Sheets Configuration
 GOOGLE_SHEETS_CREDENTIALS_PATH = os.getenv("GOOGLE_SHEETS_CREDENTIALS_PATH", "service_account.json")
 GOOGLE_SHEET_ID = os.getenv("GOOGLE_SHEET_ID", "")
 
+# Sharding policy keeping the spreadsheet bounded over time:
+#   "none"    - every daily tab lives in GOOGLE_SHEET_ID
+#   "monthly" - one spreadsheet per month, titled "<SHEETS_MONTHLY_TITLE_PREFIX> YYYY-MM"
+#               (created in GOOGLE_DRIVE_FOLDER_ID when missing)
+#   "archive" - tabs older than SHEETS_ARCHIVE_AFTER_DAYS are saved to gzip CSV and deleted
+SHEETS_SHARDING = os.getenv("SHEETS_SHARDING", "none").lower()
+if SHEETS_SHARDING not in ("none", "monthly", "archive"):
+    SHEETS_SHARDING = "none"
+SHEETS_MONTHLY_TITLE_PREFIX = os.getenv("SHEETS_MONTHLY_TITLE_PREFIX", "FMCSA DOT Leads")
+GOOGLE_DRIVE_FOLDER_ID = os.getenv("GOOGLE_DRIVE_FOLDER_ID", "")
+
+try:
+    SHEETS_ARCHIVE_AFTER_DAYS = int(os.getenv("SHEETS_ARCHIVE_AFTER_DAYS", "90"))
+    if SHEETS_ARCHIVE_AFTER_DAYS <= 0:
+        raise ValueError("SHEETS_ARCHIVE_AFTER_DAYS must be positive")
+except (ValueError, TypeError):
+    SHEETS_ARCHIVE_AFTER_DAYS = 90
+
+# Rows per request when reading the DOT Number column of an existing tab
+try:
+    SHEETS_READ_PAGE_ROWS = int(os.getenv("SHEETS_READ_PAGE_ROWS", "50000"))
+    if SHEETS_READ_PAGE_ROWS <= 0:
+        raise ValueError("SHEETS_READ_PAGE_ROWS must be positive")
+except (ValueError, TypeError):
+    SHEETS_READ_PAGE_ROWS = 50000
+
+# Chunked, rate-limited Sheets writes (429s are retried with jittered backoff)
+try:
+    SHEETS_WRITE_CHUNK_ROWS = int(os.getenv("SHEETS_WRITE_CHUNK_ROWS", "5000"))
+    if SHEETS_WRITE_CHUNK_ROWS <= 0:
+        raise ValueError("SHEETS_WRITE_CHUNK_ROWS must be positive")
+except (ValueError, TypeError):
+    SHEETS_WRITE_CHUNK_ROWS = 5000
+
+try:
+    SHEETS_WRITE_REQUESTS_PER_MINUTE = float(os.getenv("SHEETS_WRITE_REQUESTS_PER_MINUTE", "60"))
+    if SHEETS_WRITE_REQUESTS_PER_MINUTE <= 0:
+        raise ValueError("SHEETS_WRITE_REQUESTS_PER_MINUTE must be positive")
+except (ValueError, TypeError):
+    SHEETS_WRITE_REQUESTS_PER_MINUTE = 60.0  # Default per-user Sheets write quota
+
+try:
+    SHEETS_MAX_RETRIES = int(os.getenv("SHEETS_MAX_RETRIES", "5"))
+    if SHEETS_MAX_RETRIES < 0:
+        raise ValueError("SHEETS_MAX_RETRIES must not be negative")
+except (ValueError, TypeError):
+    SHEETS_MAX_RETRIES = 5
+
+try:
+    SHEETS_BACKOFF_BASE_SECONDS = float(os.getenv("SHEETS_BACKOFF_BASE_SECONDS", "1"))
+    SHEETS_BACKOFF_MAX_SECONDS = float(os.getenv("SHEETS_BACKOFF_MAX_SECONDS", "64"))
+    if SHEETS_BACKOFF_BASE_SECONDS <= 0 or SHEETS_BACKOFF_MAX_SECONDS <= 0:
+        raise ValueError("Backoff settings must be positive")
+except (ValueError, TypeError):
+    SHEETS_BACKOFF_BASE_SECONDS = 1.0
+    SHEETS_BACKOFF_MAX_SECONDS = 64.0
+
 # Email Configuration
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
@@ -25,10 +140,128 @@ SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
 EMAIL_FROM = os.getenv("EMAIL_FROM", "")
 EMAIL_TO = os.getenv("EMAIL_TO", "").split(",") if os.getenv("EMAIL_TO") else []
 
+# SMTP connections are pooled per process; one idle longer than
+# SMTP_KEEPALIVE_SECONDS is checked with NOOP before it is reused
+try:
+    SMTP_TIMEOUT_SECONDS = float(os.getenv("SMTP_TIMEOUT_SECONDS", "60"))
+    SMTP_KEEPALIVE_SECONDS = float(os.getenv("SMTP_KEEPALIVE_SECONDS", "30"))
+    if SMTP_TIMEOUT_SECONDS <= 0 or SMTP_KEEPALIVE_SECONDS < 0:
+        raise ValueError("SMTP timeouts must be positive")
+except (ValueError, TypeError):
+    SMTP_TIMEOUT_SECONDS = 60.0
+    SMTP_KEEPALIVE_SECONDS = 30.0
+
+# Daily report attachment: compression (zip, gzip or none), size cap in MB
+# (base64 adds ~33%, so 18 MB stays under 25 MB provider limits), and what to
+# do above the cap: split (by rows, across follow-up emails) or link
+EMAIL_ATTACHMENT_COMPRESSION = os.getenv("EMAIL_ATTACHMENT_COMPRESSION", "zip").lower()
+if EMAIL_ATTACHMENT_COMPRESSION not in ("zip", "gzip", "none"):
+    EMAIL_ATTACHMENT_COMPRESSION = "zip"
+
+try:
+    EMAIL_ATTACHMENT_MAX_MB = float(os.getenv("EMAIL_ATTACHMENT_MAX_MB", "18"))
+    if EMAIL_ATTACHMENT_MAX_MB <= 0:
+        raise ValueError("EMAIL_ATTACHMENT_MAX_MB must be positive")
+except (ValueError, TypeError):
+    EMAIL_ATTACHMENT_MAX_MB = 18.0
+
+EMAIL_ATTACHMENT_OVERSIZE = os.getenv("EMAIL_ATTACHMENT_OVERSIZE", "split").lower()
+if EMAIL_ATTACHMENT_OVERSIZE not in ("split", "link"):
+    EMAIL_ATTACHMENT_OVERSIZE = "split"
+
+# Base URL where OUTPUT_DIR is served, for oversize links (default: file:// path)
+EMAIL_ATTACHMENT_LINK_BASE_URL = os.getenv("EMAIL_ATTACHMENT_LINK_BASE_URL", "")
+
 # Output Configuration
 OUTPUT_DIR = os.getenv("OUTPUT_DIR", "output/csv")
 DATE_FORMAT = "%Y-%m-%d"
 
+# Compression of the CSV output files: "none", "gzip" (.csv.gz) or "zstd"
+# (.csv.zst, needs the zstandard package)
+CSV_COMPRESSION = os.getenv("CSV_COMPRESSION", "none").lower()
+if CSV_COMPRESSION not in ("none", "gzip", "zstd"):
+    CSV_COMPRESSION = "none"
+
+# Local sinks (OUTPUT_SINKS=sqlite / local_file)
+SQLITE_SINK_PATH = os.getenv("SQLITE_SINK_PATH", os.path.join(OUTPUT_DIR, "leads.sqlite3"))
+LOCAL_SINK_DIR = os.getenv("LOCAL_SINK_DIR", os.path.join(OUTPUT_DIR, "local_sink"))
+
+# Archived Sheets tabs (SHEETS_SHARDING=archive)
+SHEETS_ARCHIVE_DIR = os.getenv("SHEETS_ARCHIVE_DIR", os.path.join(OUTPUT_DIR, "sheets_archive"))
+
+# Columnar Parquet archive of every pull, partitioned by add_date (needs pyarrow)
+PARQUET_ARCHIVE_ENABLED = os.getenv("PARQUET_ARCHIVE_ENABLED", "false").lower() in ("true", "1", "yes")
+PARQUET_ARCHIVE_DIR = os.getenv("PARQUET_ARCHIVE_DIR", os.path.join(OUTPUT_DIR, "parquet"))
+
+# Local on-disk cache of Socrata responses (gzip JSON, keyed by query)
+SOCRATA_CACHE_ENABLED = os.getenv("SOCRATA_CACHE_ENABLED", "true").lower() in ("true", "1", "yes")
+SOCRATA_CACHE_DIR = os.getenv("SOCRATA_CACHE_DIR", os.path.join(OUTPUT_DIR, ".socrata_cache"))
+
+try:
+    SOCRATA_CACHE_TTL_SECONDS = int(os.getenv("SOCRATA_CACHE_TTL_SECONDS", "86400"))
+    if SOCRATA_CACHE_TTL_SECONDS <= 0:
+        raise ValueError("SOCRATA_CACHE_TTL_SECONDS must be positive")
+except (ValueError, TypeError):
+    SOCRATA_CACHE_TTL_SECONDS = 86400  # Default: 1 day
+
+try:
+    SOCRATA_CACHE_MAX_MB = int(os.getenv("SOCRATA_CACHE_MAX_MB", "512"))
+    if SOCRATA_CACHE_MAX_MB <= 0:
+        raise ValueError("SOCRATA_CACHE_MAX_MB must be positive")
+except (ValueError, TypeError):
+    SOCRATA_CACHE_MAX_MB = 512
+
+# Incremental :updated_at sync (main.py --sync)
+SYNC_STATE_PATH = os.getenv("SYNC_STATE_PATH", os.path.join(OUTPUT_DIR, "sync_state.json"))
+
+try:
+    SYNC_INITIAL_LOOKBACK_DAYS = int(os.getenv("SYNC_INITIAL_LOOKBACK_DAYS", "1"))
+    if SYNC_INITIAL_LOOKBACK_DAYS <= 0:
+        raise ValueError("SYNC_INITIAL_LOOKBACK_DAYS must be positive")
+except (ValueError, TypeError):
+    SYNC_INITIAL_LOOKBACK_DAYS = 1
+
+# Checkpointed runs: a per-date manifest records completed stages so a rerun
+# after a failure resumes at the first incomplete stage
+CHECKPOINT_RUNS = os.getenv("CHECKPOINT_RUNS", "true").lower() in ("true", "1", "yes")
+RUN_MANIFEST_DIR = os.getenv("RUN_MANIFEST_DIR", os.path.join(OUTPUT_DIR, "manifests"))
+
+# Local SQLite index of DOT numbers already written to each Sheets tab
+DOT_INDEX_ENABLED = os.getenv("DOT_INDEX_ENABLED", "true").lower() in ("true", "1", "yes")
+DOT_INDEX_PATH = os.getenv("DOT_INDEX_PATH", os.path.join(OUTPUT_DIR, "dot_index.sqlite3"))
+
+# Global cross-day deduplication: DOT numbers delivered for one date are not
+# delivered again under another date
+GLOBAL_DEDUPE_ENABLED = os.getenv("GLOBAL_DEDUPE_ENABLED", "true").lower() in ("true", "1", "yes")
+DELIVERED_STORE_PATH = os.getenv("DELIVERED_STORE_PATH", os.path.join(OUTPUT_DIR, "delivered.sqlite3"))
+
+try:
+    DELIVERED_BLOOM_CAPACITY = int(os.getenv("DELIVERED_BLOOM_CAPACITY", "1000000"))
+    if DELIVERED_BLOOM_CAPACITY <= 0:
+        raise ValueError("DELIVERED_BLOOM_CAPACITY must be positive")
+except (ValueError, TypeError):
+    DELIVERED_BLOOM_CAPACITY = 1000000
+
+try:
+    DELIVERED_BLOOM_ERROR_RATE = float(os.getenv("DELIVERED_BLOOM_ERROR_RATE", "0.001"))
+    if not 0 < DELIVERED_BLOOM_ERROR_RATE < 1:
+        raise ValueError("DELIVERED_BLOOM_ERROR_RATE must be between 0 and 1")
+except (ValueError, TypeError):
+    DELIVERED_BLOOM_ERROR_RATE = 0.001
+
+# Batches with at least this many records are processed column by column
+# instead of record by record (0 disables it)
+try:
+    COLUMNAR_ENGINE_THRESHOLD = int(os.getenv("COLUMNAR_ENGINE_THRESHOLD", "50000"))
+    if COLUMNAR_ENGINE_THRESHOLD < 0:
+        raise ValueError("COLUMNAR_ENGINE_THRESHOLD must not be negative")
+except (ValueError, TypeError):
+    COLUMNAR_ENGINE_THRESHOLD = 50000
+
+# Streaming mode: process and deliver one API page at a time instead of
+# loading the whole day into memory first
+STREAM_PAGES = os.getenv("STREAM_PAGES", "false").lower() in ("true", "1", "yes")
+
 # Scheduler Configuration
 MODE = os.getenv("MODE", "production").lower()  # "test" or "production"
 
@@ -67,6 +300,10 @@ except Exception:
     # Default to 300 seconds (5 minutes) if invalid
     TEST_INTERVAL_SECONDS = 300
 
+# Opt-in: run the automation inside the scheduler process (reuses the Google
+# Sheets session between runs) instead of spawning main.py for every run
+SCHEDULER_IN_PROCESS = os.getenv("SCHEDULER_IN_PROCESS", "false").lower() in ("true", "1", "yes")
+
 # Production cron schedule - must be valid hour (0-23) and minute (0-59)
 try:
     PRODUCTION_CRON_HOUR = int(os.getenv("PRODUCTION_CRON_HOUR", "2"))
@@ -83,6 +320,8 @@ except (ValueError, TypeError):
     PRODUCTION_CRON_MINUTE = 0  # Default: 0 minutes
 
 # Required Fields
+# date_pulled is generated locally; every other field is a dataset column
+LOCAL_FIELDS = ["date_pulled"]
 REQUIRED_FIELDS = [
     "dot_number",
     "legal_name",
@@ -2,28 +2,230 @@
 CSV file handler for DOT leads backup
 """
 import csv
+import gzip
 import logging
+import mmap
 import os
+import re
+from contextlib import nullcontext
 from datetime import datetime
-from typing import List, Dict
-from config import OUTPUT_DIR, DATE_FORMAT
+from typing import Iterable, Iterator, List, Optional, Set, Tuple
+from config import OUTPUT_DIR, DATE_FORMAT, CSV_COMPRESSION
 from utils import ensure_output_directory
-from data_processor import DataProcessor
+from data_processor import DataProcessor, DOTRecord
+from parquet_archive import open_archive
+
+try:
+    import zstandard
+except ImportError:  # zstandard is optional; CSV_COMPRESSION=zstd falls back to gzip without it
+    zstandard = None
 
 logger = logging.getLogger(__name__)
 
+# File extension appended to ".csv" for each compression
+COMPRESSION_EXTENSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+# DOT Number is the first column and is always written as unquoted digits
+# right after csv.writer's \r\n line terminator (which also skips the header)
+DOT_NUMBER_PATTERN = re.compile(rb"\r\n(\d+),")
+
+# Same, but consuming each whole record so that a line break inside a quoted
+# field (e.g. a multi-line legal name) can never start a phantom record;
+# slower, so only used for files that have such fields. Written as an unrolled
+# loop (unquoted run, then quoted field and unquoted run, repeated) so there is
+# exactly one way to match a record and an unterminated final row fails in
+# linear time instead of backtracking exponentially
+DOT_NUMBER_RECORD_PATTERN = re.compile(rb'\r\n(\d+),[^"\r\n]*(?:"[^"]*"[^"\r\n]*)*(?=\r\n|\Z)')
+
+# An opening quote and whatever comes first after it: its closing quote or a line break
+QUOTED_FIELD_PATTERN = re.compile(rb'"[^"\r\n]*(["\r\n])')
+
+# Daily "_all" backups, optionally compressed
+BACKUP_NAME_PATTERN = re.compile(r"^dot_leads_(\d{4}-\d{2}-\d{2})_all\.csv(\.gz|\.zst)?$")
+
+
+def resolve_compression(compression: str) -> str:
+    """Return the compression actually available for a configured one"""
+    if compression == "zstd" and zstandard is None:
+        logger.warning("CSV_COMPRESSION=zstd but the zstandard package is not installed; using gzip")
+        return "gzip"
+    return compression
+
+
+def open_csv_file(path: str, mode: str):
+    """
+    Open a CSV file in text mode, compressed according to its extension
+    
+    Args:
+        path: File path (.csv, .csv.gz or .csv.zst)
+        mode: "r" or "w"
+    
+    Returns:
+        Text file object suitable for csv.reader / csv.writer
+    """
+    if path.endswith(".gz") or path.endswith(".gz.tmp"):
+        return gzip.open(path, f"{mode}t", compresslevel=6, newline='', encoding='utf-8')
+    if path.endswith(".zst") or path.endswith(".zst.tmp"):
+        return zstandard.open(path, f"{mode}t", newline='', encoding='utf-8')
+    return open(path, mode, newline='', encoding='utf-8')
+
+
+def scan_dot_numbers(filepath: str) -> Set[str]:
+    """
+    Extract the DOT Number column of a CSV file with a byte-level scan
+    
+    Plain files are memory-mapped and scanned in place; compressed files are
+    decompressed to bytes first. No rows are parsed, so this is much faster
+    than csv.reader for rebuilding seen-sets from many backups.
+    
+    Args:
+        filepath: Path of a .csv, .csv.gz or .csv.zst file written by CSVHandler
+    
+    Returns:
+        Set of DOT numbers in the file
+    """
+    header = DataProcessor.get_column_headers()[0].encode("ascii")
+    
+    if filepath.endswith(".gz") or filepath.endswith(".zst"):
+        if filepath.endswith(".zst") and zstandard is None:
+            logger.warning(f"Skipping {filepath}: the zstandard package is not installed")
+            return set()
+        opener = gzip.open if filepath.endswith(".gz") else zstandard.open
+        with opener(filepath, "rb") as f:
+            data = f.read()
+        return _scan_dot_numbers(filepath, data, header)
+    
+    if os.path.getsize(filepath) == 0:
+        return set()
+    with open(filepath, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return _scan_dot_numbers(filepath, data, header)
+
+
+def _has_quoted_line_break(data) -> bool:
+    """Check whether any quoted field contains a line break, scanning ``data`` (e.g. an mmap) in place"""
+    # Each match resumes after the previous closing quote, so it always starts
+    # at an opening quote ("" escapes simply pair up as an empty field)
+    for match in QUOTED_FIELD_PATTERN.finditer(data):
+        if match.group(1) != b'"':
+            return True
+    return False
+
+
+def _scan_dot_numbers(filepath: str, data, header: bytes) -> Set[str]:
+    if data[:len(header)] != header:
+        logger.warning(f"Skipping {filepath}: first column is not {header.decode()}")
+        return set()
+    pattern = DOT_NUMBER_RECORD_PATTERN if _has_quoted_line_break(data) else DOT_NUMBER_PATTERN
+    return set(map(bytes.decode, pattern.findall(data)))
+
+
+class CSVRecordWriter:
+    """Incrementally writes processed records to a single (optionally compressed) CSV file"""
+    
+    def __init__(self, filepath: str):
+        """
+        Open a temporary file next to the destination and write the header row
+        
+        The file only appears at ``filepath`` once the writer is closed
+        successfully, so readers never see a half-written CSV.
+        
+        Args:
+            filepath: Destination path of the CSV file (.csv, .csv.gz or .csv.zst)
+        """
+        self.filepath = filepath
+        self.tmp_path = f"{filepath}.tmp"
+        self.count = 0
+        self._file = open_csv_file(self.tmp_path, 'w')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(DataProcessor.get_column_headers())
+    
+    def write_record(self, record: DOTRecord) -> None:
+        """Append one processed record"""
+        self._writer.writerow(record)
+        self.count += 1
+    
+    def write(self, records: Iterable[DOTRecord]) -> None:
+        """Append a batch of processed records"""
+        for record in records:
+            self.write_record(record)
+    
+    def close(self) -> None:
+        """Flush and close the file and move it into place"""
+        if self._file and not self._file.closed:
+            self._file.close()
+            os.replace(self.tmp_path, self.filepath)
+    
+    def discard(self) -> None:
+        """Close and delete the file without moving it into place"""
+        if self._file and not self._file.closed:
+            self._file.close()
+            os.remove(self.tmp_path)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type:
+            self.discard()
+        else:
+            self.close()
+        return False
+
 
 class CSVHandler:
     """Handles CSV file operations"""
     
-    def __init__(self):
-        """Initialize CSV handler"""
+    def __init__(self, compression: str = CSV_COMPRESSION):
+        """
+        Initialize CSV handler
+        
+        Args:
+            compression: "none", "gzip" or "zstd" (defaults to CSV_COMPRESSION)
+        """
         ensure_output_directory(OUTPUT_DIR)
+        self.compression = resolve_compression(compression)
+        self.archive = open_archive()
+    
+    def get_filepath(self, date: str, suffix: str = "") -> str:
+        """Build the CSV path for a date and optional suffix"""
+        filename = f"dot_leads_{date}{suffix}.csv{COMPRESSION_EXTENSIONS[self.compression]}"
+        return os.path.join(OUTPUT_DIR, filename)
+    
+    def open_writer(self, date: str, suffix: str = "") -> CSVRecordWriter:
+        """
+        Open an incremental CSV writer for streaming records to disk
+        
+        Args:
+            date: Date string in YYYY-MM-DD format
+            suffix: Optional suffix for filename (e.g., "_new" for new records only)
+        
+        Returns:
+            CSVRecordWriter positioned after the header row
+        """
+        return CSVRecordWriter(self.get_filepath(date, suffix))
+    
+    def open_archive_writer(self, date: str, suffix: str = ""):
+        """
+        Open a Parquet archive writer for the same pull as a CSV file
+        
+        Args:
+            date: Date string in YYYY-MM-DD format
+            suffix: Optional suffix for the archive file name
+        
+        Returns:
+            Context manager yielding a ParquetArchiveWriter, or None when the archive is disabled
+        """
+        if not self.archive:
+            return nullcontext()
+        return self.archive.open_writer(f"dot_leads_{date}{suffix}")
     
-    def save_records(self, records: List[Dict], date: str, suffix: str = "") -> str:
+    def save_records(self, records: Iterable[DOTRecord], date: str, suffix: str = "") -> str:
         """
         Save records to CSV file
         
+        Rows are written as they are consumed, so ``records`` may be a
+        generator and is never materialized as a full list of rows.
+        
         Args:
             records: Processed DOT records
             date: Date string in YYYY-MM-DD format
@@ -32,21 +234,162 @@ class CSVHandler:
         Returns:
             Path to the created CSV file
         """
-        filename = f"dot_leads_{date}{suffix}.csv"
-        filepath = os.path.join(OUTPUT_DIR, filename)
+        try:
+            with self.open_writer(date, suffix) as writer:
+                writer.write(records)
+            
+            logger.info(f"Saved {writer.count} records to CSV: {writer.filepath}")
+            return writer.filepath
+            
+        except Exception as e:
+            logger.error(f"Error saving CSV file: {str(e)}")
+            raise
+    
+    def save_all_and_new(self, records: Iterable[DOTRecord], new_dot_numbers: Set[str],
+                         date: str) -> Tuple[str, Optional[str]]:
+        """
+        Write the "_all" and "_new" CSV files in a single pass over the records
+        
+        When the Parquet archive is enabled, the same pass also archives every record.
+        
+        Args:
+            records: Processed DOT records (may be a generator)
+            new_dot_numbers: DOT numbers of the records that go to "_new" as well
+            date: Date string in YYYY-MM-DD format
+        
+        Returns:
+            Tuple of (path of "_all", path of "_new" or None if no record was new)
+        """
+        try:
+            with self.open_writer(date, "_all") as all_writer, \
+                    self.open_writer(date, "_new") as new_writer, \
+                    self.open_archive_writer(date) as archive_writer:
+                for record in records:
+                    all_writer.write_record(record)
+                    if archive_writer:
+                        archive_writer.write_record(record)
+                    if record.dot_number in new_dot_numbers:
+                        new_writer.write_record(record)
+                
+                # Keep the original contract: no "_new" file when nothing is new
+                if not new_writer.count:
+                    new_writer.discard()
+            
+            logger.info(f"Saved {all_writer.count} records to CSV: {all_writer.filepath}")
+            if not new_writer.count:
+                return all_writer.filepath, None
+            logger.info(f"Saved {new_writer.count} new records to CSV: {new_writer.filepath}")
+            return all_writer.filepath, new_writer.filepath
+            
+        except Exception as e:
+            logger.error(f"Error saving CSV files: {str(e)}")
+            raise
+    
+    def list_backups(self, start_date: Optional[str] = None,
+                     end_date: Optional[str] = None) -> List[Tuple[str, str]]:
+        """
+        List the daily "_all" backups in OUTPUT_DIR, oldest first
+        
+        Args:
+            start_date: Optional first date (YYYY-MM-DD), inclusive
+            end_date: Optional last date (YYYY-MM-DD), inclusive
+        
+        Returns:
+            List of (date, filepath) tuples
+        """
+        backups = []
+        for filename in os.listdir(OUTPUT_DIR):
+            match = BACKUP_NAME_PATTERN.match(filename)
+            if not match:
+                continue
+            date = match.group(1)
+            if (start_date and date < start_date) or (end_date and date > end_date):
+                continue
+            backups.append((date, os.path.join(OUTPUT_DIR, filename)))
+        return sorted(backups)
+    
+    def iter_backup_dot_numbers(self, start_date: Optional[str] = None,
+                                end_date: Optional[str] = None) -> Iterator[Tuple[str, Set[str]]]:
+        """
+        Yield the DOT numbers of each daily "_all" backup, oldest first
+        
+        Args:
+            start_date: Optional first date (YYYY-MM-DD), inclusive
+            end_date: Optional last date (YYYY-MM-DD), inclusive
+        
+        Yields:
+            (date, set of DOT numbers) per backup file
+        """
+        for date, filepath in self.list_backups(start_date, end_date):
+            yield date, scan_dot_numbers(filepath)
+    
+    def load_dot_numbers(self, start_date: Optional[str] = None, end_date: Optional[str] = None,
+                         seen: Optional[Set[str]] = None) -> Set[str]:
+        """
+        Load (or refresh) a seen-set of DOT numbers from the daily "_all" backups
+        
+        Args:
+            start_date: Optional first date (YYYY-MM-DD), inclusive; pass the
+                        last loaded date to refresh an existing set
+            end_date: Optional last date (YYYY-MM-DD), inclusive
+            seen: Optional existing set to add to (updated in place)
+        
+        Returns:
+            The set of DOT numbers
+        """
+        seen = set() if seen is None else seen
+        file_count = 0
+        for _, dot_numbers in self.iter_backup_dot_numbers(start_date, end_date):
+            seen.update(dot_numbers)
+            file_count += 1
+        logger.info(f"Loaded {len(seen)} DOT numbers from {file_count} CSV backups")
+        return seen
+    
+    def upsert_records(self, records: List[DOTRecord], date: str, suffix: str = "_all") -> Optional[str]:
+        """
+        Merge records into an existing CSV by DOT number
+        
+        Rows whose DOT number is already in the file are replaced in place and
+        the rest are appended. The file is rewritten atomically. A missing
+        file is not created: sync only touches dates that were delivered.
+        
+        Args:
+            records: Processed DOT records
+            date: Date string in YYYY-MM-DD format
+            suffix: Filename suffix of the file to merge into
+        
+        Returns:
+            Path to the CSV file, or None if there is no such file
+        """
+        if self.archive:
+            # One file per sync run: a fixed name would overwrite earlier syncs
+            run_stamp = datetime.now().strftime("%Y%m%dT%H%M%S%f")
+            with self.archive.open_writer(f"dot_leads_{date}_sync_{run_stamp}") as archive_writer:
+                archive_writer.write(records)
+        
+        filepath = self.get_filepath(date, suffix)
+        if not os.path.exists(filepath):
+            logger.info(f"No CSV backup for {date}; not creating one for {len(records)} synced records")
+            return None
         
         try:
-            # Format data for output
-            rows = DataProcessor.format_for_output(records)
+            updates = {record.dot_number: record for record in records}
+            tmp_path = f"{filepath}.tmp"
             
-            # Write to CSV
-            with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
-                writer = csv.writer(csvfile)
-                writer.writerows(rows)
+            with open_csv_file(filepath, 'r') as src, open_csv_file(tmp_path, 'w') as dst:
+                reader = csv.reader(src)
+                writer = csv.writer(dst)
+                writer.writerow(next(reader, DataProcessor.get_column_headers()))
+                for row in reader:
+                    dot_number = row[0] if row else ""
+                    writer.writerow(updates.pop(dot_number, row))
+                # Whatever is left was not in the file yet
+                writer.writerows(updates.values())
             
-            logger.info(f"Saved {len(records)} records to CSV: {filepath}")
+            os.replace(tmp_path, filepath)
+            logger.info(f"Upserted {len(records)} records into CSV: {filepath}")
             return filepath
             
         except Exception as e:
-            logger.error(f"Error saving CSV file: {str(e)}")
+            logger.error(f"Error upserting CSV file: {str(e)}")
             raise
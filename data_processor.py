@@ -2,19 +2,47 @@
 Data processing and formatting for DOT records
 """
 import logging
+import sys
 from datetime import datetime
-from typing import List, Dict
-from utils import format_date, deduplicate_by_dot_number
-from config import DATE_FORMAT, REQUIRED_FIELDS
+from collections import Counter
+from itertools import repeat
+from typing import Iterable, Iterator, List, Dict, NamedTuple, Optional, Set
+from utils import format_date, deduplicate_by_dot_number, pop_date_parse_failures, paused_gc
+from config import DATE_FORMAT, REQUIRED_FIELDS, COLUMNAR_ENGINE_THRESHOLD
+from delivered_store import DeliveredStore
 
 logger = logging.getLogger(__name__)
 
+# Raw dataset columns, in DOTRecord order (date_pulled is added locally)
+SOURCE_COLUMNS = [
+    "dot_number", "legal_name", "dba_name", "phy_city",
+    "phy_state", "phy_zip", "telephone", "add_date"
+]
+
+
+class DOTRecord(NamedTuple):
+    """
+    A processed DOT lead
+    
+    Fields are in output column order, so a record is already a CSV/Sheets
+    row and is shared as-is by every output instead of being copied.
+    """
+    dot_number: str
+    legal_name: str
+    dba_name: str
+    phy_city: str
+    phy_state: str
+    phy_zip: str
+    telephone: str
+    add_date: str
+    date_pulled: str
+
 
 class DataProcessor:
     """Processes and formats DOT records"""
     
     @staticmethod
-    def extract_required_fields(records: List[Dict]) -> List[Dict]:
+    def extract_required_fields(records: List[Dict]) -> List[DOTRecord]:
         """
         Extract and format required fields from raw DOT records
         
@@ -29,40 +57,131 @@ class DataProcessor:
         
         for record in records:
             try:
-                formatted_record = {
-                    "dot_number": str(record.get("dot_number", "")).strip(),
-                    "legal_name": str(record.get("legal_name", "")).strip(),
-                    "dba_name": str(record.get("dba_name", "")).strip(),
-                    "phy_city": str(record.get("phy_city", "")).strip(),
-                    "phy_state": str(record.get("phy_state", "")).strip(),
-                    "phy_zip": str(record.get("phy_zip", "")).strip(),
-                    "telephone": str(record.get("telephone", "")).strip(),
-                    "add_date": format_date(str(record.get("add_date", ""))),
-                    "date_pulled": date_pulled
-                }
+                dot_number = str(record.get("dot_number", "")).strip()
                 
                 # Only include records with DOT number
-                if formatted_record["dot_number"]:
-                    formatted_records.append(formatted_record)
+                if not dot_number:
+                    continue
+                
+                # Low-cardinality values are interned so records share one string object
+                formatted_records.append(DOTRecord(
+                    dot_number,
+                    str(record.get("legal_name", "")).strip(),
+                    str(record.get("dba_name", "")).strip(),
+                    str(record.get("phy_city", "")).strip(),
+                    sys.intern(str(record.get("phy_state", "")).strip()),
+                    str(record.get("phy_zip", "")).strip(),
+                    str(record.get("telephone", "")).strip(),
+                    sys.intern(format_date(str(record.get("add_date", "")))),
+                    date_pulled
+                ))
                     
             except Exception as e:
                 logger.warning(f"Error processing record: {record}. Error: {str(e)}")
                 continue
         
+        DataProcessor._log_date_failures(pop_date_parse_failures())
+        
         logger.info(f"Extracted {len(formatted_records)} records with required fields")
         return formatted_records
     
     @staticmethod
-    def process_records(records: List[Dict]) -> List[Dict]:
+    def _log_date_failures(date_failures: Counter) -> None:
+        """Log one summary line for unparseable add_date values instead of one per record"""
+        if date_failures:
+            examples = ", ".join(repr(value) for value, _ in date_failures.most_common(3))
+            logger.warning(f"Could not parse {sum(date_failures.values())} add_date value(s) "
+                           f"({len(date_failures)} distinct, e.g. {examples}); kept as-is")
+    
+    @staticmethod
+    def use_columnar_engine(record_count: int) -> bool:
+        """Return True if a batch of this size should go through the columnar engine"""
+        return 0 < COLUMNAR_ENGINE_THRESHOLD <= record_count
+    
+    @staticmethod
+    def _extract_column(records: List[Dict], field: str) -> List[str]:
+        """Extract one raw field from every record as a stripped string (missing -> "")"""
+        return [
+            (value if value.__class__ is str else str(value)).strip()
+            for value in map(dict.get, records, repeat(field), repeat(""))
+        ]
+    
+    @staticmethod
+    def _map_distinct(column: List[str], func) -> List[str]:
+        """Apply ``func`` once per distinct value of a column and map the results back"""
+        mapping = {value: func(value) for value in set(column)}
+        return [mapping[value] for value in column]
+    
+    @staticmethod
+    def process_records_columnar(records: List[Dict], seen: Optional[Set[str]] = None) -> List[DOTRecord]:
+        """
+        Process a large batch one column at a time
+        
+        Same output contract as process_records (first occurrence of each DOT
+        number wins, input order is kept), but each field is extracted and
+        stripped in a single pass over the batch, empty-DOT filtering and
+        deduplication look only at the DOT column, dates are normalized once
+        per distinct value and records are assembled without per-record
+        Python calls. The cyclic garbage collector is paused meanwhile, since
+        it would otherwise rescan the growing heap many times.
+        
+        Args:
+            records: Raw records from API
+            seen: Optional set of DOT numbers already emitted (updated in place)
+        
+        Returns:
+            Processed and deduplicated records
+        """
+        date_pulled = datetime.now().strftime(DATE_FORMAT)
+        if seen is None:
+            seen = set()
+        
+        with paused_gc():
+            columns = [DataProcessor._extract_column(records, field) for field in SOURCE_COLUMNS]
+            
+            # Only include records with DOT number, first occurrence wins
+            keep = []
+            for index, dot_number in enumerate(columns[0]):
+                if dot_number and dot_number not in seen:
+                    seen.add(dot_number)
+                    keep.append(index)
+            if len(keep) < len(records):
+                columns = [[column[index] for index in keep] for column in columns]
+            
+            # Normalize/intern low-cardinality columns once per distinct value
+            add_date_index = SOURCE_COLUMNS.index("add_date")
+            raw_dates = columns[add_date_index]
+            columns[add_date_index] = DataProcessor._map_distinct(
+                raw_dates, lambda value: sys.intern(format_date(value))
+            )
+            date_failures = pop_date_parse_failures()
+            if date_failures:
+                DataProcessor._log_date_failures(Counter(value for value in raw_dates if value in date_failures))
+            state_index = SOURCE_COLUMNS.index("phy_state")
+            columns[state_index] = DataProcessor._map_distinct(columns[state_index], sys.intern)
+            
+            unique = list(map(DOTRecord._make, zip(*columns, repeat(date_pulled))))
+        
+        logger.info(f"Columnar engine processed {len(records)} records to {len(unique)} unique records")
+        return unique
+    
+    @staticmethod
+    def process_records(records: List[Dict]) -> List[DOTRecord]:
         """
         Process records: extract fields, deduplicate, and format
         
+        Batches of at least COLUMNAR_ENGINE_THRESHOLD records are handled by
+        the column-at-a-time engine (process_records_columnar).
+        
         Args:
             records: Raw records from API
         
         Returns:
             Processed and deduplicated records
         """
+        if DataProcessor.use_columnar_engine(len(records)):
+            return DataProcessor.process_records_columnar(records)
+        
         # Extract required fields
         formatted = DataProcessor.extract_required_fields(records)
         
@@ -71,6 +190,93 @@ class DataProcessor:
         
         return unique
     
+    @staticmethod
+    def iter_process_records(pages: Iterable[List[Dict]]) -> Iterator[List[DOTRecord]]:
+        """
+        Process raw records page by page, deduplicating across pages
+        
+        Args:
+            pages: Iterable of raw record pages (e.g. DOTFetcher.iter_new_dots)
+        
+        Yields:
+            Processed and deduplicated records for each page
+        """
+        seen = set()
+        for page in pages:
+            if DataProcessor.use_columnar_engine(len(page)):
+                unique = DataProcessor.process_records_columnar(page, seen)
+            else:
+                formatted = DataProcessor.extract_required_fields(page)
+                unique = deduplicate_by_dot_number(formatted, seen)
+            if unique:
+                yield unique
+    
+    @staticmethod
+    def filter_delivered(records: List[DOTRecord], delivered_store: DeliveredStore, target_date: str) -> List[DOTRecord]:
+        """
+        Drop records whose DOT number was already delivered for a different date
+        
+        Records first delivered for ``target_date`` itself are kept, so
+        re-running a date behaves exactly as before.
+        
+        Args:
+            records: Processed records for one date
+            delivered_store: Global store of delivered DOT numbers
+            target_date: Date in YYYY-MM-DD format the records are delivered for
+        
+        Returns:
+            Records not yet delivered on another date
+        """
+        first_seen = delivered_store.first_seen(record.dot_number for record in records)
+        if not first_seen:
+            return records
+        
+        kept = [record for record in records if first_seen.get(record.dot_number, target_date) == target_date]
+        if len(kept) < len(records):
+            logger.info(f"Skipped {len(records) - len(kept)} records already delivered on another date")
+        return kept
+    
+    @staticmethod
+    def filter_new_records(records: List[DOTRecord], existing_dots: Set[str]) -> List[DOTRecord]:
+        """
+        Return records whose DOT number is not in ``existing_dots``
+        
+        ``existing_dots`` is updated in place with the DOT numbers returned,
+        so the same set can be reused across successive batches.
+        
+        Args:
+            records: Processed DOT records
+            existing_dots: DOT numbers already present in the output (e.g. a Sheets tab)
+        
+        Returns:
+            List of records not yet in the output
+        """
+        new_records = []
+        for record in records:
+            dot_number = record.dot_number
+            if dot_number and dot_number not in existing_dots:
+                existing_dots.add(dot_number)
+                new_records.append(record)
+        return new_records
+    
+    @staticmethod
+    def group_by_add_date(batches: Iterable[List[DOTRecord]]) -> Dict[str, List[DOTRecord]]:
+        """
+        Split processed records into per-day buckets keyed by add_date
+        
+        Args:
+            batches: Iterable of processed record batches
+        
+        Returns:
+            Dict mapping add_date (YYYY-MM-DD) to its records, in date order
+        """
+        by_date = {}
+        for batch in batches:
+            for record in batch:
+                by_date.setdefault(record.add_date, []).append(record)
+        
+        return {date: by_date[date] for date in sorted(by_date)}
+    
     @staticmethod
     def get_column_headers() -> List[str]:
         """Get column headers for output"""
@@ -87,7 +293,7 @@ class DataProcessor:
         ]
     
     @staticmethod
-    def format_for_output(records: List[Dict]) -> List[List]:
+    def format_for_output(records: List[DOTRecord]) -> List:
         """
         Format records for CSV/Sheets output
         
@@ -95,23 +301,8 @@ class DataProcessor:
             records: Processed records
         
         Returns:
-            List of lists (rows) for output
+            List of rows for output (header row first); records are used as rows directly
         """
-        headers = DataProcessor.get_column_headers()
-        rows = [headers]
-        
-        for record in records:
-            row = [
-                record.get("dot_number", ""),
-                record.get("legal_name", ""),
-                record.get("dba_name", ""),
-                record.get("phy_city", ""),
-                record.get("phy_state", ""),
-                record.get("phy_zip", ""),
-                record.get("telephone", ""),
-                record.get("add_date", ""),
-                record.get("date_pulled", "")
-            ]
-            rows.append(row)
-        
+        rows = [DataProcessor.get_column_headers()]
+        rows.extend(records)
         return rows
@@ -0,0 +1,190 @@
+"""
+Global store of DOT numbers already delivered, used for cross-day deduplication
+"""
+import hashlib
+import logging
+import math
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Stay well below SQLite's host parameter limit in IN (...) lookups
+LOOKUP_CHUNK_SIZE = 500
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings (no false negatives, tunable false positive rate)"""
+
+    def __init__(self, capacity: int, error_rate: float, bits: Optional[bytearray] = None):
+        """
+        Create an empty filter, or wrap existing bits
+
+        Args:
+            capacity: Number of items the filter is sized for
+            error_rate: Target false positive rate at capacity
+            bits: Optional bit array previously produced by a filter of the same size
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        # Double hashing: position_i = h1 + i * h2 (Kirsch-Mitzenmacher)
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        size = self.size
+        return [(h1 + i * h2) % size for i in range(self.hash_count)]
+
+    def add(self, item: str) -> None:
+        """Add an item"""
+        bits = self.bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+class DeliveredStore:
+    """
+    Persistent record of every DOT number delivered, with the date and run it was first delivered in
+
+    Lookups go through an in-memory Bloom filter first, so the SQLite table
+    is only queried for the (rare) DOT numbers that may have been delivered.
+    The filter's bits are saved next to the database and reloaded while they
+    still match the table; otherwise they are rebuilt from it.
+    """
+
+    def __init__(self, path: str, bloom_capacity: int, bloom_error_rate: float, run_id: Optional[str] = None):
+        """
+        Open (or create) the store
+
+        Args:
+            path: Path of the SQLite database file
+            bloom_capacity: Minimum number of DOT numbers the Bloom filter is sized for
+            bloom_error_rate: Bloom filter false positive rate at capacity
+            run_id: Identifier recorded with new deliveries (default: current timestamp)
+        """
+        self.path = path
+        self.bloom_path = f"{path}.bloom"
+        self.bloom_capacity = bloom_capacity
+        self.bloom_error_rate = bloom_error_rate
+        self.run_id = run_id or datetime.now().strftime("%Y%m%dT%H%M%S")
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS delivered (
+                dot_number TEXT PRIMARY KEY,
+                first_seen TEXT NOT NULL,
+                run_id TEXT NOT NULL
+            ) WITHOUT ROWID;
+        """)
+        self.count = self.conn.execute("SELECT COUNT(*) FROM delivered").fetchone()[0]
+        self.bloom = self._load_bloom() or self._build_bloom()
+
+    def _capacity_for(self, count: int) -> int:
+        return max(self.bloom_capacity, count * 2)
+
+    def _load_bloom(self) -> Optional[BloomFilter]:
+        """Load the saved filter if it was written for the current table contents"""
+        try:
+            with open(self.bloom_path, "rb") as f:
+                header = f.readline().decode("ascii").split()
+                bits = bytearray(f.read())
+        except (OSError, UnicodeDecodeError):
+            return None
+        try:
+            capacity, count = int(header[0]), int(header[1])
+            error_rate = float(header[2])
+        except (IndexError, ValueError):
+            return None
+        if count != self.count or count > capacity or error_rate != self.bloom_error_rate:
+            return None
+
+        bloom = BloomFilter(capacity, error_rate, bits)
+        if len(bits) != (bloom.size + 7) // 8:
+            return None
+        return bloom
+
+    def _build_bloom(self) -> BloomFilter:
+        """Build the filter from every DOT number in the table"""
+        bloom = BloomFilter(self._capacity_for(self.count), self.bloom_error_rate)
+        for (dot_number,) in self.conn.execute("SELECT dot_number FROM delivered"):
+            bloom.add(dot_number)
+        if self.count:
+            logger.info(f"Built delivered-DOT Bloom filter over {self.count} DOT numbers")
+        return bloom
+
+    def save_bloom(self) -> None:
+        """Atomically write the Bloom filter bits next to the database"""
+        tmp_path = f"{self.bloom_path}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(f"{self.bloom.capacity} {self.count} {self.bloom.error_rate}\n".encode("ascii"))
+            f.write(self.bloom.bits)
+        os.replace(tmp_path, self.bloom_path)
+
+    def first_seen(self, dot_numbers: Iterable[str]) -> Dict[str, str]:
+        """
+        Look up when DOT numbers were first delivered
+
+        Args:
+            dot_numbers: DOT numbers to look up
+
+        Returns:
+            Dict of DOT number to first_seen date, for delivered DOT numbers only
+        """
+        candidates = [dot_number for dot_number in dot_numbers if dot_number in self.bloom]
+        found = {}
+        for start in range(0, len(candidates), LOOKUP_CHUNK_SIZE):
+            chunk = candidates[start:start + LOOKUP_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT dot_number, first_seen FROM delivered WHERE dot_number IN ({placeholders})",
+                chunk
+            )
+            found.update(rows)
+        return found
+
+    def mark_delivered(self, dot_numbers: Iterable[str], first_seen: str) -> None:
+        """
+        Record DOT numbers as delivered (DOT numbers already known keep their original entry)
+
+        Args:
+            dot_numbers: DOT numbers that were delivered
+            first_seen: Date in YYYY-MM-DD format they were delivered for
+        """
+        dot_numbers = list(dot_numbers)
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO delivered (dot_number, first_seen, run_id) VALUES (?, ?, ?)",
+                ((dot_number, first_seen, self.run_id) for dot_number in dot_numbers)
+            )
+            self.count += self.conn.total_changes - before
+
+        if self.count > self.bloom.capacity:
+            # Keep the false positive rate bounded as history grows
+            self.bloom = self._build_bloom()
+        else:
+            for dot_number in dot_numbers:
+                self.bloom.add(dot_number)
+
+    def close(self) -> None:
+        """Persist the Bloom filter and close the database connection"""
+        try:
+            self.save_bloom()
+        except OSError as e:
+            logger.warning(f"Could not save Bloom filter {self.bloom_path}: {str(e)}")
+        self.conn.close()
@@ -2,31 +2,101 @@
 Socrata API client for fetching FMCSA DOT records
 """
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional
+import requests
 from sodapy import Socrata
-from config import SOCRATA_DOMAIN, SOCRATA_DATASET_ID, SOCRATA_APP_TOKEN, DATE_FORMAT
+from config import (
+    SOCRATA_DOMAIN, SOCRATA_DATASET_ID, SOCRATA_APP_TOKEN, SOCRATA_PAGE_SIZE,
+    SOCRATA_FETCH_CONCURRENCY, SOCRATA_PAGINATION, SOCRATA_EXTRA_FIELDS, REQUIRED_FIELDS, LOCAL_FIELDS,
+    SOCRATA_CACHE_ENABLED, SOCRATA_CACHE_DIR, SOCRATA_CACHE_TTL_SECONDS, SOCRATA_CACHE_MAX_MB,
+    SOCRATA_MAX_RETRIES, SOCRATA_BACKOFF_BASE_SECONDS, SOCRATA_BACKOFF_MAX_SECONDS,
+    SOCRATA_UNAUTHENTICATED_RATE, DATE_FORMAT
+)
+from socrata_cache import SocrataCache
+from utils import TokenBucket, call_with_retry
 
 logger = logging.getLogger(__name__)
 
-
 class DOTFetcher:
     """Fetches DOT records from FMCSA Socrata API"""
     
-    def __init__(self):
-        """Initialize Socrata client"""
+    def __init__(self, concurrency: Optional[int] = None, pagination: Optional[str] = None,
+                 use_cache: Optional[bool] = None):
+        """
+        Initialize Socrata client
+        
+        Args:
+            concurrency: Number of pages to fetch in parallel. If None, uses
+                         SOCRATA_FETCH_CONCURRENCY from config.
+            pagination: "offset" or "keyset". If None, uses SOCRATA_PAGINATION from config.
+            use_cache: Whether to use the on-disk response cache. If None, uses
+                       SOCRATA_CACHE_ENABLED from config.
+        """
         self.client = Socrata(SOCRATA_DOMAIN, SOCRATA_APP_TOKEN, timeout=60)
         self.dataset_id = SOCRATA_DATASET_ID
+        self.page_size = SOCRATA_PAGE_SIZE
+        self.concurrency = concurrency or SOCRATA_FETCH_CONCURRENCY
+        self.pagination = pagination or SOCRATA_PAGINATION
+        self.select_clause = self.build_select_clause()
+        # Highest dot_number yielded so far; a keyset resume point
+        self.last_dot_number = None
         
-    def fetch_new_dots(self, target_date: Optional[str] = None) -> List[Dict]:
+        self.max_retries = SOCRATA_MAX_RETRIES
+        # Unauthenticated requests are throttled hard by Socrata; pace them client-side
+        self.rate_limiter = None
+        if not SOCRATA_APP_TOKEN:
+            self.rate_limiter = TokenBucket(SOCRATA_UNAUTHENTICATED_RATE)
+        
+        if use_cache is None:
+            use_cache = SOCRATA_CACHE_ENABLED
+        self.cache = None
+        if use_cache:
+            self.cache = SocrataCache(
+                SOCRATA_CACHE_DIR,
+                SOCRATA_CACHE_TTL_SECONDS,
+                SOCRATA_CACHE_MAX_MB * 1024 * 1024
+            )
+    
+    @staticmethod
+    def build_select_clause(system_fields: Optional[List[str]] = None) -> Optional[str]:
         """
-        Fetch new DOT records for a specific date
+        Build the $select projection from REQUIRED_FIELDS and SOCRATA_EXTRA_FIELDS
         
         Args:
-            target_date: Date in YYYY-MM-DD format. If None, uses yesterday's date.
+            system_fields: Optional Socrata system fields to include (e.g. [":updated_at"])
         
         Returns:
-            List of DOT records
+            Comma-separated column list, or None to fetch every column
+        """
+        if "*" in SOCRATA_EXTRA_FIELDS:
+            # System fields are not part of "*" and must be requested explicitly
+            return ", ".join(system_fields + ["*"]) if system_fields else None
+        
+        columns = list(system_fields or [])
+        for field in REQUIRED_FIELDS + SOCRATA_EXTRA_FIELDS:
+            if field not in LOCAL_FIELDS and field not in columns:
+                columns.append(field)
+        return ", ".join(columns)
+    
+    def iter_new_dots(self, target_date: Optional[str] = None,
+                      after_dot_number: Optional[str] = None) -> Iterator[List[Dict]]:
+        """
+        Yield pages of new DOT records for a specific date as they arrive
+        
+        Only one page is held in memory at a time, so callers that consume
+        the pages incrementally keep a flat memory profile regardless of
+        how many records the date has.
+        
+        Args:
+            target_date: Date in YYYY-MM-DD format. If None, uses yesterday's date.
+            after_dot_number: Keyset resume point; only records with a greater
+                              dot_number are fetched. Forces keyset pagination.
+        
+        Yields:
+            Lists of raw DOT records, one list per API page
         """
         if target_date is None:
             # Default to yesterday's date
@@ -40,42 +110,317 @@ class DOTFetcher:
         date_str = target_date.replace('-', '')
         where_clause = f"add_date = '{date_str}'"
         
-        all_records = []
-        limit = 50000  # Socrata default limit
-        offset = 0
+        return self.iter_where(where_clause, after_dot_number, cacheable=self.is_settled(target_date))
+    
+    def iter_dots_in_range(self, start_date: str, end_date: str,
+                           after_dot_number: Optional[str] = None) -> Iterator[List[Dict]]:
+        """
+        Yield pages of DOT records added between two dates (inclusive)
+        
+        A single paged ``add_date BETWEEN`` query replaces one query per day,
+        which is what backfills over many days want.
+        
+        Args:
+            start_date: First date in YYYY-MM-DD format
+            end_date: Last date in YYYY-MM-DD format
+            after_dot_number: Keyset resume point (see iter_new_dots)
+        
+        Yields:
+            Lists of raw DOT records, one list per API page
+        """
+        logger.info(f"Fetching DOT records for date range: {start_date} to {end_date}")
+        
+        # add_date is a YYYYMMDD string, so lexical BETWEEN matches date order
+        start_str = start_date.replace('-', '')
+        end_str = end_date.replace('-', '')
+        where_clause = f"add_date between '{start_str}' and '{end_str}'"
+        
+        return self.iter_where(where_clause, after_dot_number, cacheable=self.is_settled(end_date))
+    
+    def iter_updated_since(self, watermark: str) -> Iterator[List[Dict]]:
+        """
+        Yield pages of DOT records whose system :updated_at is after a watermark
+        
+        Records include the ``:updated_at`` field so callers can advance the
+        watermark once the pages have been delivered.
+        
+        Args:
+            watermark: Socrata timestamp of the last successful sync
+        
+        Yields:
+            Lists of raw DOT records, one list per API page
+        """
+        logger.info(f"Fetching DOT records updated since: {watermark}")
+        
+        escaped = watermark.replace("'", "''")
+        where_clause = f":updated_at > '{escaped}'"
+        select_clause = self.build_select_clause([":updated_at"])
+        
+        # Open-ended: every rerun must see the records updated since the last one
+        return self.iter_where(where_clause, select_clause=select_clause, cacheable=False)
+    
+    @staticmethod
+    def is_settled(last_date: str) -> bool:
+        """
+        Check whether every day up to a date is finished publishing
+        
+        Socrata keeps adding records for today and yesterday, so pages for
+        those days must not be replayed from the cache.
+        
+        Args:
+            last_date: Last date covered by a query, in YYYY-MM-DD format
+        
+        Returns:
+            True if the date is older than yesterday
+        """
+        yesterday = (datetime.now() - timedelta(days=1)).strftime(DATE_FORMAT)
+        return last_date < yesterday
+    
+    def iter_where(self, where_clause: str, after_dot_number: Optional[str] = None,
+                   select_clause: Optional[str] = None, cacheable: bool = True) -> Iterator[List[Dict]]:
+        """
+        Yield pages of DOT records matching a SoQL where clause
+        
+        Uses the configured pagination strategy (offset, concurrent offset
+        or keyset).
+        
+        Args:
+            where_clause: SoQL where clause
+            after_dot_number: Keyset resume point; forces keyset pagination
+            select_clause: Optional $select overriding the default projection
+            cacheable: Whether pages may be served from and stored in the
+                       response cache (False for days still being published)
+        
+        Yields:
+            Lists of raw DOT records, one list per API page
+        """
+        total = 0
         
         try:
-            while True:
-                logger.info(f"Fetching records: offset={offset}, limit={limit}")
-                
-                # Fetch records with pagination
-                results = self.client.get(
-                    self.dataset_id,
-                    where=where_clause,
-                    limit=limit,
-                    offset=offset,
-                    order="dot_number"
-                )
-                
-                if not results:
-                    break
-                
-                all_records.extend(results)
-                logger.info(f"Fetched {len(results)} records (total: {len(all_records)})")
-                
-                # If we got fewer than the limit, we've reached the end
-                if len(results) < limit:
-                    break
-                
-                offset += limit
+            if self.pagination == "keyset" or after_dot_number is not None:
+                if self.concurrency > 1:
+                    logger.info("Keyset pagination is sequential; ignoring fetch concurrency")
+                pages = self._iter_pages_keyset(where_clause, select_clause, after_dot_number, cacheable)
+            elif self.concurrency > 1:
+                pages = self._iter_pages_concurrent(where_clause, select_clause, cacheable)
+            else:
+                pages = self._iter_pages_sequential(where_clause, select_clause, cacheable=cacheable)
+            
+            for results in pages:
+                self.last_dot_number = results[-1].get("dot_number")
+                total += len(results)
+                logger.info(f"Fetched {len(results)} records (total: {total})")
+                yield results
             
-            logger.info(f"Total records fetched: {len(all_records)}")
-            return all_records
+            logger.info(f"Total records fetched: {total}")
             
         except Exception as e:
             logger.error(f"Error fetching DOT records: {str(e)}")
             raise
     
+    def fetch_new_dots(self, target_date: Optional[str] = None) -> List[Dict]:
+        """
+        Fetch new DOT records for a specific date
+        
+        Args:
+            target_date: Date in YYYY-MM-DD format. If None, uses yesterday's date.
+        
+        Returns:
+            List of DOT records
+        """
+        all_records = []
+        for page in self.iter_new_dots(target_date):
+            all_records.extend(page)
+        return all_records
+    
+    def fetch_dots_in_range(self, start_date: str, end_date: str) -> List[Dict]:
+        """
+        Fetch DOT records added between two dates (inclusive)
+        
+        Args:
+            start_date: First date in YYYY-MM-DD format
+            end_date: Last date in YYYY-MM-DD format
+        
+        Returns:
+            List of DOT records
+        """
+        all_records = []
+        for page in self.iter_dots_in_range(start_date, end_date):
+            all_records.extend(page)
+        return all_records
+    
+    def count_records(self, where_clause: str) -> int:
+        """
+        Count the records matching a SoQL where clause
+        
+        Args:
+            where_clause: SoQL where clause
+        
+        Returns:
+            Number of matching records
+        """
+        # Never cached: a count taken before the day is published (or before
+        # late records arrive) would otherwise be replayed for the whole TTL
+        results = self._get_with_retry({"select": "count(*) AS record_count", "where": where_clause})
+        if not results:
+            return 0
+        return int(results[0].get("record_count", 0))
+    
+    def _fetch_page(self, where_clause: str, offset: Optional[int] = None,
+                    select_clause: Optional[str] = None, cacheable: bool = True) -> List[Dict]:
+        """Fetch a single page of records, at the given offset if one is provided"""
+        params = {
+            "where": where_clause,
+            "limit": self.page_size,
+            "order": "dot_number"
+        }
+        if offset is not None:
+            logger.info(f"Fetching records: offset={offset}, limit={self.page_size}")
+            params["offset"] = offset
+        else:
+            logger.info(f"Fetching records: where={where_clause}, limit={self.page_size}")
+        # Only request the columns we use instead of the full census record
+        select_clause = select_clause or self.select_clause
+        if select_clause:
+            params["select"] = select_clause
+        return self._get(cacheable, **params)
+    
+    def _get(self, cacheable: bool = True, **params) -> List[Dict]:
+        """
+        Run a Socrata query, serving it from the on-disk cache when possible
+        
+        Args:
+            cacheable: Whether the response may be served from and stored in the cache
+            **params: Query parameters passed to Socrata.get
+        
+        Returns:
+            Records returned by the API (or the cache)
+        """
+        if self.cache is None or not cacheable:
+            return self._get_with_retry(params)
+        
+        key = SocrataCache.make_key(self.dataset_id, params)
+        results = self.cache.get(key)
+        if results is not None:
+            logger.info(f"Served {len(results)} records from Socrata cache")
+            return results
+        
+        results = self._get_with_retry(params)
+        # Empty pages are not cached: the day may simply not be published yet
+        if results:
+            self.cache.put(key, results)
+        return results
+    
+    def _get_with_retry(self, params: Dict) -> List[Dict]:
+        """
+        Call the Socrata API, retrying transient failures of this one request
+        
+        Throttling (429), 5xx responses, connection errors and timeouts are
+        retried with jittered exponential backoff, waiting at least as long
+        as any Retry-After header asks. Pages fetched earlier are unaffected.
+        
+        Args:
+            params: Query parameters passed to Socrata.get
+        
+        Returns:
+            Records returned by the API
+        """
+        return call_with_retry(
+            lambda: self.client.get(self.dataset_id, **params),
+            requests.exceptions.HTTPError, self.max_retries,
+            SOCRATA_BACKOFF_BASE_SECONDS, SOCRATA_BACKOFF_MAX_SECONDS,
+            rate_limiter=self.rate_limiter, description="Socrata request"
+        )
+    
+    def _iter_pages_sequential(self, where_clause: str, select_clause: Optional[str] = None,
+                               offset: int = 0, cacheable: bool = True) -> Iterator[List[Dict]]:
+        """Yield pages one request at a time, starting at ``offset``"""
+        while True:
+            results = self._fetch_page(where_clause, offset, select_clause, cacheable)
+            
+            if not results:
+                break
+            
+            yield results
+            
+            # If we got fewer than the limit, we've reached the end
+            if len(results) < self.page_size:
+                break
+            
+            offset += self.page_size
+    
+    def _iter_pages_keyset(self, where_clause: str, select_clause: Optional[str] = None,
+                           after_dot_number: Optional[str] = None,
+                           cacheable: bool = True) -> Iterator[List[Dict]]:
+        """
+        Yield pages using keyset (seek) pagination on dot_number
+        
+        Each request asks for ``dot_number > last seen`` instead of an
+        offset, so the server never has to skip rows (page latency stays flat)
+        and page boundaries do not shift if rows are added mid-pull.
+        """
+        last_seen = after_dot_number
+        while True:
+            if last_seen is None:
+                page_where = where_clause
+            else:
+                escaped = str(last_seen).replace("'", "''")
+                page_where = f"({where_clause}) AND dot_number > '{escaped}'"
+            
+            results = self._fetch_page(page_where, select_clause=select_clause, cacheable=cacheable)
+            
+            if not results:
+                break
+            
+            yield results
+            
+            if len(results) < self.page_size:
+                break
+            
+            last_seen = results[-1].get("dot_number")
+    
+    def _iter_pages_concurrent(self, where_clause: str, select_clause: Optional[str] = None,
+                               cacheable: bool = True) -> Iterator[List[Dict]]:
+        """
+        Yield pages fetched in parallel, in the same order as sequential paging
+        
+        A count(*) query sizes the result set first; page offsets are then
+        requested through a bounded thread pool with at most ``concurrency``
+        requests in flight, and pages are yielded strictly in offset order.
+        """
+        total = self.count_records(where_clause)
+        logger.info(f"Count query matched {total} records; fetching with concurrency={self.concurrency}")
+        
+        offsets = iter(range(0, total, self.page_size))
+        pending = deque()
+        last_page_full = False
+        next_offset = 0
+        
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            try:
+                for offset in offsets:
+                    pending.append(executor.submit(self._fetch_page, where_clause, offset, select_clause, cacheable))
+                    if len(pending) >= self.concurrency:
+                        break
+                
+                while pending:
+                    results = pending.popleft().result()
+                    offset = next(offsets, None)
+                    if offset is not None:
+                        pending.append(executor.submit(self._fetch_page, where_clause, offset, select_clause, cacheable))
+                    
+                    if results:
+                        yield results
+                    last_page_full = len(results) == self.page_size
+                    next_offset += self.page_size
+            finally:
+                for future in pending:
+                    future.cancel()
+        
+        # Rows added after the count query: continue sequentially past the counted range
+        if last_page_full:
+            yield from self._iter_pages_sequential(where_clause, select_clause, next_offset, cacheable)
+    
     def close(self):
         """Close the Socrata client"""
         if self.client:
@@ -0,0 +1,153 @@
+"""
+Local SQLite index of DOT numbers already delivered to Google Sheets tabs
+"""
+import logging
+import os
+import sqlite3
+from datetime import datetime
+from typing import Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class DOTIndex:
+    """
+    Tracks the DOT numbers and row count of each tab so deduplication and appends need no Sheets reads
+
+    Tabs are keyed by (spreadsheet ID, tab title): the same title in another
+    spreadsheet (a new GOOGLE_SHEET_ID, or the next month's spreadsheet) is a
+    different tab.
+    """
+
+    def __init__(self, path: str):
+        """
+        Open (or create) the index database
+
+        Args:
+            path: Path of the SQLite database file
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(tabs)")]
+        if columns and "spreadsheet_id" not in columns:
+            # Index written before tabs were keyed by spreadsheet: it is only a
+            # cache, so drop it and let tabs be re-read from the sheet
+            logger.info("DOT index predates per-spreadsheet keys; rebuilding it as tabs are read")
+            self.conn.executescript("DROP TABLE IF EXISTS tab_dots; DROP TABLE IF EXISTS tabs;")
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS tabs (
+                spreadsheet_id TEXT NOT NULL,
+                tab TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                synced_at TEXT NOT NULL,
+                PRIMARY KEY (spreadsheet_id, tab)
+            );
+            CREATE TABLE IF NOT EXISTS tab_dots (
+                spreadsheet_id TEXT NOT NULL,
+                tab TEXT NOT NULL,
+                dot_number TEXT NOT NULL,
+                PRIMARY KEY (spreadsheet_id, tab, dot_number)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_tab_dots_dot_number ON tab_dots (dot_number);
+        """)
+
+    def has_tab(self, spreadsheet_id: str, tab: str) -> bool:
+        """Return True if the tab's DOT numbers have been fully loaded into the index"""
+        row = self.conn.execute(
+            "SELECT 1 FROM tabs WHERE spreadsheet_id = ? AND tab = ?", (spreadsheet_id, tab)
+        ).fetchone()
+        return row is not None
+
+    def get_row_count(self, spreadsheet_id: str, tab: str) -> Optional[int]:
+        """
+        Get the number of rows in use in a tab (header included)
+
+        Args:
+            spreadsheet_id: Spreadsheet ID
+            tab: Worksheet title
+
+        Returns:
+            Row count, or None if the tab is not indexed
+        """
+        row = self.conn.execute(
+            "SELECT row_count FROM tabs WHERE spreadsheet_id = ? AND tab = ?", (spreadsheet_id, tab)
+        ).fetchone()
+        return row[0] if row else None
+
+    def get_dot_numbers(self, spreadsheet_id: str, tab: str) -> Set[str]:
+        """
+        Get the DOT numbers delivered to a tab
+
+        Args:
+            spreadsheet_id: Spreadsheet ID
+            tab: Worksheet title
+
+        Returns:
+            Set of DOT numbers
+        """
+        rows = self.conn.execute(
+            "SELECT dot_number FROM tab_dots WHERE spreadsheet_id = ? AND tab = ?", (spreadsheet_id, tab)
+        )
+        return {dot_number for (dot_number,) in rows}
+
+    def add(self, spreadsheet_id: str, tab: str, dot_numbers: Iterable[str], row_count: int = 0) -> None:
+        """
+        Record DOT numbers appended to a tab
+
+        Writes to a tab that was never indexed are recorded too, but the tab
+        is only treated as complete once rebuild_tab has loaded it.
+
+        Args:
+            spreadsheet_id: Spreadsheet ID
+            tab: Worksheet title
+            dot_numbers: DOT numbers that were written
+            row_count: Number of rows the write appended to the tab
+        """
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO tab_dots (spreadsheet_id, tab, dot_number) VALUES (?, ?, ?)",
+                ((spreadsheet_id, tab, dot_number) for dot_number in dot_numbers)
+            )
+            if row_count:
+                self.conn.execute(
+                    "UPDATE tabs SET row_count = row_count + ? WHERE spreadsheet_id = ? AND tab = ?",
+                    (row_count, spreadsheet_id, tab)
+                )
+
+    def rebuild_tab(self, spreadsheet_id: str, tab: str, dot_numbers: Iterable[str], row_count: int) -> None:
+        """
+        Replace the indexed DOT numbers of a tab (e.g. with what the sheet actually contains)
+
+        Args:
+            spreadsheet_id: Spreadsheet ID
+            tab: Worksheet title
+            dot_numbers: Complete set of DOT numbers in the tab
+            row_count: Number of rows in use in the tab (header included)
+        """
+        with self.conn:
+            self.conn.execute("DELETE FROM tab_dots WHERE spreadsheet_id = ? AND tab = ?", (spreadsheet_id, tab))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO tabs (spreadsheet_id, tab, row_count, synced_at) VALUES (?, ?, ?, ?)",
+                (spreadsheet_id, tab, row_count, datetime.now().isoformat(timespec="seconds"))
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO tab_dots (spreadsheet_id, tab, dot_number) VALUES (?, ?, ?)",
+                ((spreadsheet_id, tab, dot_number) for dot_number in dot_numbers)
+            )
+        logger.info(f"Rebuilt DOT index for tab '{tab}'")
+
+    def forget_tab(self, spreadsheet_id: str, tab: str) -> None:
+        """Drop a tab from the index so the next lookup reads it from the sheet again"""
+        with self.conn:
+            self.conn.execute("DELETE FROM tab_dots WHERE spreadsheet_id = ? AND tab = ?", (spreadsheet_id, tab))
+            self.conn.execute("DELETE FROM tabs WHERE spreadsheet_id = ? AND tab = ?", (spreadsheet_id, tab))
+
+    def close(self) -> None:
+        """Close the database connection"""
+        self.conn.close()
@@ -1,19 +1,62 @@
 """
 Email notification handler
 """
+import base64
+import csv
+import gzip
 import logging
+import math
 import os
+import shutil
 import smtplib
+import threading
+import time
+import zipfile
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
-from email import encoders
 from datetime import datetime
-from typing import List, Optional
-from config import SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, EMAIL_FROM, EMAIL_TO
+from typing import List, Optional, Tuple
+from config import (
+    SMTP_SERVER, SMTP_PORT, SMTP_USERNAME, SMTP_PASSWORD, EMAIL_FROM, EMAIL_TO,
+    SMTP_TIMEOUT_SECONDS, SMTP_KEEPALIVE_SECONDS, EMAIL_ATTACHMENT_COMPRESSION,
+    EMAIL_ATTACHMENT_MAX_MB, EMAIL_ATTACHMENT_OVERSIZE, EMAIL_ATTACHMENT_LINK_BASE_URL
+)
+from csv_handler import open_csv_file
 
 logger = logging.getLogger(__name__)
 
+# Process-wide pool of authenticated SMTP connections keyed by
+# (server, port, username), each stored with the time it was last used, so
+# consecutive emails (a range backfill, a report then an error notification)
+# share one TLS session instead of each paying the handshake and login
+_pool_lock = threading.Lock()
+_connections = {}
+
+
+# Raw bytes read per base64 chunk; a multiple of 57 so every chunk encodes to whole 76-character lines
+ENCODE_CHUNK_BYTES = 57 * 1024
+
+# MIME types of the attachment formats
+ATTACHMENT_TYPES = {".zip": ("application", "zip"), ".gz": ("application", "gzip"),
+                    ".zst": ("application", "zstd")}
+
+
+def _quit(server: smtplib.SMTP) -> None:
+    """Close an SMTP connection, ignoring errors from an already dead one"""
+    try:
+        server.quit()
+    except (smtplib.SMTPException, OSError):
+        server.close()
+
+
+def close_smtp_connections() -> None:
+    """Close every pooled SMTP connection"""
+    with _pool_lock:
+        for server, _ in _connections.values():
+            _quit(server)
+        _connections.clear()
+
 
 class EmailHandler:
     """Handles email notifications"""
@@ -26,19 +69,27 @@ class EmailHandler:
         self.smtp_password = SMTP_PASSWORD
         self.email_from = EMAIL_FROM or SMTP_USERNAME
         self.email_to = EMAIL_TO
+        self.attachment_compression = EMAIL_ATTACHMENT_COMPRESSION
+        self.attachment_max_bytes = int(EMAIL_ATTACHMENT_MAX_MB * 1024 * 1024)
     
     def send_daily_report(self, date: str, new_record_count: int, total_record_count: int, 
-                         existing_count: int, sheet_url: str, csv_path: Optional[str] = None) -> bool:
+                         existing_count: int, sheet_url: Optional[str], csv_path: Optional[str] = None) -> bool:
         """
         Send daily report email with Google Sheet link and CSV attachment
         Only includes information about NEW records
         
+        The CSV is compressed (EMAIL_ATTACHMENT_COMPRESSION) before attaching.
+        If it is still larger than EMAIL_ATTACHMENT_MAX_MB it is either split
+        by rows across follow-up emails or replaced with a link to the file
+        (EMAIL_ATTACHMENT_OVERSIZE).
+        
         Args:
             date: Date string in YYYY-MM-DD format
             new_record_count: Number of NEW records added
             total_record_count: Total number of records found for this date
             existing_count: Number of existing records in sheet
-            sheet_url: URL to the Google Sheet
+            sheet_url: URL to the Google Sheet (None if no tab was written because
+                       every record was already delivered on another date)
             csv_path: Path to CSV file to attach (should contain only new records)
         
         Returns:
@@ -48,7 +99,15 @@ class EmailHandler:
             logger.warning("No email recipients configured")
             return False
         
+        attachments, link, temp_paths = [], None, []
         try:
+            # Prepare the (compressed, size-capped) attachment of new records
+            if csv_path and new_record_count > 0:
+                try:
+                    attachments, link, temp_paths = self._prepare_attachments(csv_path, new_record_count)
+                except Exception as e:
+                    logger.warning(f"Could not prepare CSV attachment: {str(e)}")
+            
             # Create message
             msg = MIMEMultipart()
             msg['From'] = self.email_from
@@ -80,12 +139,31 @@ Summary:
 Google Sheet Link:
 {sheet_url}
 
-The CSV attachment contains only the NEW records that were added today.
+"""
+                if link:
+                    body += f"""The file of NEW records is too large to attach. Download it from:
+{link}
+"""
+                elif len(attachments) > 1:
+                    body += f"""The NEW records that were added today are attached in {len(attachments)} parts
+(this email and {len(attachments) - 1} follow-up email(s)).
+"""
+                elif attachments:
+                    body += """The CSV attachment contains only the NEW records that were added today.
+"""
+                elif csv_path:
+                    body += f"""The CSV of NEW records could not be attached. It is saved on the server at:
+{csv_path}
+"""
+                else:
+                    body += """The CSV of NEW records could not be attached.
 """
             else:
                 body += f"""
 ℹ️  No new records found. All {total_record_count} records for {date} already exist in the sheet.
-
+"""
+                if sheet_url:
+                    body += f"""
 Google Sheet Link:
 {sheet_url}
 """
@@ -97,28 +175,27 @@ This is an automated message from the FMCSA DOT Leads Automation system.
             
             msg.attach(MIMEText(body, 'plain'))
             
-            # Attach CSV file if provided and contains new records
-            if csv_path and new_record_count > 0:
-                try:
-                    with open(csv_path, 'rb') as attachment:
-                        part = MIMEBase('application', 'octet-stream')
-                        part.set_payload(attachment.read())
-                    
-                    encoders.encode_base64(part)
-                    part.add_header(
-                        'Content-Disposition',
-                        f'attachment; filename= {os.path.basename(csv_path)}'
-                    )
-                    msg.attach(part)
-                    logger.info(f"Attached CSV file with {new_record_count} new records: {csv_path}")
-                except Exception as e:
-                    logger.warning(f"Could not attach CSV file: {str(e)}")
+            messages = [msg]
+            for index, attachment_path in enumerate(attachments, start=1):
+                if index == 1:
+                    part_msg = msg
+                else:
+                    # Each further part travels in its own email to stay under the size cap
+                    part_msg = MIMEMultipart()
+                    part_msg['From'] = self.email_from
+                    part_msg['To'] = ', '.join(self.email_to)
+                    part_msg['Subject'] = f"{msg['Subject']} - part {index}/{len(attachments)}"
+                    part_msg.attach(MIMEText(
+                        f"Part {index} of {len(attachments)} of the NEW DOT records for {date}.\n", 'plain'
+                    ))
+                    messages.append(part_msg)
+                part_msg.attach(self._encode_attachment(attachment_path))
+            if attachments:
+                logger.info(f"Attached {len(attachments)} file(s) with {new_record_count} new records: "
+                            f"{', '.join(os.path.basename(path) for path in attachments)}")
             
-            # Send email
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
+            # Send email(s) over one connection
+            self._send_messages(messages)
             
             logger.info(f"Daily report email sent successfully to {', '.join(self.email_to)}")
             return True
@@ -126,6 +203,186 @@ This is an automated message from the FMCSA DOT Leads Automation system.
         except Exception as e:
             logger.error(f"Error sending email: {str(e)}")
             raise
+        
+        finally:
+            # Attachments are encoded into the messages; the intermediate files are no longer needed
+            for path in temp_paths:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+    
+    def _compress_file(self, path: str) -> str:
+        """
+        Compress a CSV file for attaching (streamed from disk, never fully in memory)
+        
+        Files that are already compressed, or compression "none", are returned unchanged.
+        
+        Returns:
+            Path of the file to attach
+        """
+        if self.attachment_compression == "none" or path.endswith((".gz", ".zst", ".zip")):
+            return path
+        if self.attachment_compression == "gzip":
+            compressed_path = f"{path}.gz"
+            with open(path, 'rb') as src, gzip.open(compressed_path, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, ENCODE_CHUNK_BYTES)
+            return compressed_path
+        
+        compressed_path = f"{os.path.splitext(path)[0]}.zip"
+        with zipfile.ZipFile(compressed_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            archive.write(path, arcname=os.path.basename(path))
+        return compressed_path
+    
+    def _split_csv(self, csv_path: str, part_count: int, record_count: int) -> List[str]:
+        """Split a CSV by rows into part_count plain CSV files, each with the header row"""
+        filename = os.path.basename(csv_path)
+        stem = os.path.join(os.path.dirname(csv_path), filename[:filename.index(".csv")])
+        rows_per_part = math.ceil(record_count / part_count)
+        paths = []
+        
+        with open_csv_file(csv_path, 'r') as src:
+            reader = csv.reader(src)
+            header = next(reader)
+            dst = None
+            try:
+                for row_number, row in enumerate(reader):
+                    if row_number % rows_per_part == 0:
+                        if dst:
+                            dst.close()
+                        paths.append(f"{stem}_part{len(paths) + 1}.csv")
+                        dst = open(paths[-1], 'w', newline='', encoding='utf-8')
+                        writer = csv.writer(dst)
+                        writer.writerow(header)
+                    writer.writerow(row)
+            finally:
+                if dst:
+                    dst.close()
+        return paths
+    
+    def _prepare_attachments(self, csv_path: str, record_count: int) -> Tuple[List[str], Optional[str], List[str]]:
+        """
+        Compress the CSV and enforce the attachment size cap
+        
+        Args:
+            csv_path: CSV file of new records (plain or compressed)
+            record_count: Number of records in the file
+        
+        Returns:
+            Tuple of (files to attach, download link or None, temporary files to delete after sending)
+        """
+        attachment = self._compress_file(csv_path)
+        temp_paths = [] if attachment == csv_path else [attachment]
+        size = os.path.getsize(attachment)
+        if size <= self.attachment_max_bytes:
+            return [attachment], None, temp_paths
+        
+        logger.warning(f"Attachment {os.path.basename(attachment)} is {size / 1048576:.1f} MB, "
+                       f"over the {self.attachment_max_bytes / 1048576:.1f} MB cap ({EMAIL_ATTACHMENT_OVERSIZE})")
+        
+        if EMAIL_ATTACHMENT_OVERSIZE == "split":
+            # Aim for parts at ~90% of the cap; halve the part size until every part fits
+            part_count = math.ceil(size / (self.attachment_max_bytes * 0.9))
+            while part_count <= record_count:
+                parts = []
+                for part_path in self._split_csv(csv_path, part_count, record_count):
+                    compressed_path = self._compress_file(part_path)
+                    if compressed_path != part_path:
+                        os.remove(part_path)
+                    parts.append(compressed_path)
+                if all(os.path.getsize(path) <= self.attachment_max_bytes for path in parts):
+                    return parts, None, temp_paths + parts
+                for path in parts:
+                    os.remove(path)
+                part_count *= 2
+            logger.warning("Could not split the attachment under the size cap; sending a link instead")
+        
+        # Link to the artifact instead of attaching it; keep the (compressed) file for download
+        if EMAIL_ATTACHMENT_LINK_BASE_URL:
+            link = f"{EMAIL_ATTACHMENT_LINK_BASE_URL.rstrip('/')}/{os.path.basename(attachment)}"
+        else:
+            link = f"file://{os.path.abspath(attachment)}"
+        return [], link, []
+    
+    def _encode_attachment(self, path: str) -> MIMEBase:
+        """
+        Build a base64 MIME part from a file
+        
+        The file is read and encoded in line-aligned chunks, so the raw bytes
+        are never held as a whole. The encoded payload itself (about 1.33x the
+        file) is built in memory, since smtplib serializes the whole message
+        before sending; EMAIL_ATTACHMENT_MAX_MB bounds it.
+        """
+        maintype, subtype = ATTACHMENT_TYPES.get(os.path.splitext(path)[1], ('application', 'octet-stream'))
+        chunks = []
+        with open(path, 'rb') as f:
+            while True:
+                chunk = f.read(ENCODE_CHUNK_BYTES)
+                if not chunk:
+                    break
+                chunks.append(base64.encodebytes(chunk).decode('ascii'))
+        
+        part = MIMEBase(maintype, subtype)
+        part.set_payload(''.join(chunks))
+        part['Content-Transfer-Encoding'] = 'base64'
+        part.add_header('Content-Disposition', 'attachment', filename=os.path.basename(path))
+        return part
+    
+    def send_sync_report(self, since: str, until: str, results: List[tuple]) -> bool:
+        """
+        Send incremental sync report email
+        
+        Args:
+            since: :updated_at watermark the sync started from
+            until: New :updated_at watermark
+            results: List of (date, new_count, updated_count, sheet_url) per add_date
+        
+        Returns:
+            True if email sent successfully
+        """
+        if not self.email_to:
+            logger.warning("No email recipients configured")
+            return False
+        
+        try:
+            new_total = sum(result[1] for result in results)
+            updated_total = sum(result[2] for result in results)
+            
+            msg = MIMEMultipart()
+            msg['From'] = self.email_from
+            msg['To'] = ', '.join(self.email_to)
+            msg['Subject'] = f"DOT Leads Sync Report ({new_total} NEW, {updated_total} updated records)"
+            
+            body = f"""
+FMCSA DOT Leads Incremental Sync Report
+
+Changes since: {since}
+Synced through: {until}
+
+Summary:
+- NEW records added: {new_total}
+- Existing records updated: {updated_total}
+
+Per ADD_DATE:
+"""
+            for date, new_count, updated_count, sheet_url in results:
+                body += f"- {date}: {new_count} new, {updated_count} updated - {sheet_url}\n"
+            
+            body += """
+---
+This is an automated message from the FMCSA DOT Leads Automation system.
+"""
+            
+            msg.attach(MIMEText(body, 'plain'))
+            
+            self._send_message(msg)
+            
+            logger.info(f"Sync report email sent successfully to {', '.join(self.email_to)}")
+            return True
+            
+        except Exception as e:
+            logger.error(f"Error sending sync report email: {str(e)}")
+            raise
     
     def send_error_notification(self, error_message: str) -> bool:
         """
@@ -161,10 +418,7 @@ This is an automated error notification from the FMCSA DOT Leads Automation syst
             
             msg.attach(MIMEText(body, 'plain'))
             
-            with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-                server.starttls()
-                server.login(self.smtp_username, self.smtp_password)
-                server.send_message(msg)
+            self._send_message(msg)
             
             logger.info(f"Error notification email sent to {', '.join(self.email_to)}")
             return True
@@ -172,3 +426,55 @@ This is an automated error notification from the FMCSA DOT Leads Automation syst
         except Exception as e:
             logger.error(f"Error sending error notification email: {str(e)}")
             return False
+    
+    def _connect(self) -> smtplib.SMTP:
+        """Open a new authenticated SMTP connection"""
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=SMTP_TIMEOUT_SECONDS)
+        try:
+            server.starttls()
+            server.login(self.smtp_username, self.smtp_password)
+        except Exception:
+            _quit(server)
+            raise
+        logger.info(f"Opened SMTP connection to {self.smtp_server}:{self.smtp_port}")
+        return server
+    
+    def _get_connection(self, key: tuple) -> smtplib.SMTP:
+        """Take the pooled connection if it is still alive, otherwise open a new one (pool lock held)"""
+        entry = _connections.pop(key, None)
+        if entry:
+            server, last_used = entry
+            if time.monotonic() - last_used < SMTP_KEEPALIVE_SECONDS:
+                return server
+            # Idle long enough that the server may have dropped it
+            try:
+                if server.noop()[0] == 250:
+                    return server
+            except (smtplib.SMTPException, OSError):
+                pass
+            logger.info("Pooled SMTP connection is no longer alive; reconnecting")
+            _quit(server)
+        return self._connect()
+    
+    def _send_messages(self, messages: List[MIMEMultipart]) -> None:
+        """Send messages over the pooled SMTP connection, reconnecting once if it drops"""
+        key = (self.smtp_server, self.smtp_port, self.smtp_username)
+        with _pool_lock:
+            server = self._get_connection(key)
+            try:
+                for msg in messages:
+                    try:
+                        server.send_message(msg)
+                    except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+                        logger.warning(f"SMTP connection dropped ({str(e)}); reconnecting")
+                        _quit(server)
+                        server = self._connect()
+                        server.send_message(msg)
+            except Exception:
+                _quit(server)
+                raise
+            _connections[key] = (server, time.monotonic())
+    
+    def _send_message(self, msg: MIMEMultipart) -> None:
+        """Send a message over the pooled SMTP connection"""
+        self._send_messages([msg])
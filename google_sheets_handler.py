@@ -1,38 +1,156 @@
 """
 Google Sheets integration for DOT leads
 """
+import csv
+import gzip
 import logging
-from datetime import datetime
-from typing import List, Dict
+import os
+import threading
+import zlib
+from datetime import datetime, timedelta
+from functools import partial
+from typing import List, Dict, Optional, Set
 import gspread
 from google.oauth2.service_account import Credentials
-from config import GOOGLE_SHEETS_CREDENTIALS_PATH, GOOGLE_SHEET_ID, DATE_FORMAT
-from data_processor import DataProcessor
+from config import (
+    GOOGLE_SHEETS_CREDENTIALS_PATH, GOOGLE_SHEET_ID, DATE_FORMAT, DOT_INDEX_ENABLED, DOT_INDEX_PATH,
+    SHEETS_READ_PAGE_ROWS, SHEETS_SHARDING, SHEETS_MONTHLY_TITLE_PREFIX, GOOGLE_DRIVE_FOLDER_ID,
+    SHEETS_ARCHIVE_AFTER_DAYS, SHEETS_ARCHIVE_DIR, EMAIL_TO
+)
+from data_processor import DataProcessor, DOTRecord
+from dot_index import DOTIndex
+from sheets_writer import SheetsBatchWriter
+from utils import ensure_output_directory
 
 logger = logging.getLogger(__name__)
 
+# Process-level caches, reused by every handler created in a long-running
+# scheduler process or a warm serverless container
+_cache_lock = threading.Lock()
+_clients = {}       # credentials path -> authorized gspread client
+_spreadsheets = {}  # sheet id -> (Spreadsheet, {tab title: sheet properties})
+_created_tabs = set()  # (sheet id, tab title) created by this process, never archived by it
 
-class GoogleSheetsHandler:
-    """Handles Google Sheets operations"""
+
+def get_client(credentials_path: str) -> gspread.Client:
+    """
+    Get the authorized gspread client for a service account, authorizing only once per process
     
-    def __init__(self):
-        """Initialize Google Sheets client"""
-        try:
+    Args:
+        credentials_path: Path of the service account JSON file
+    
+    Returns:
+        Authorized gspread client (its credentials refresh their token automatically)
+    """
+    with _cache_lock:
+        client = _clients.get(credentials_path)
+        if client is None:
             # Authenticate using service account
             scope = [
                 'https://spreadsheets.google.com/feeds',
                 'https://www.googleapis.com/auth/drive'
             ]
             credentials = Credentials.from_service_account_file(
-                GOOGLE_SHEETS_CREDENTIALS_PATH,
+                credentials_path,
                 scopes=scope
             )
-            self.client = gspread.authorize(credentials)
+            client = gspread.authorize(credentials)
+            _clients[credentials_path] = client
+        return client
+
+
+def open_monthly_spreadsheet(client: gspread.Client, month: str, create: bool = True) -> Optional[tuple]:
+    """
+    Open the spreadsheet for a month (YYYY-MM), creating it if needed, reusing the process-level cache
+    
+    New spreadsheets are created in GOOGLE_DRIVE_FOLDER_ID when set, so they
+    inherit that folder's sharing; otherwise they are shared with the
+    EMAIL_TO recipients, who could not open the emailed links otherwise.
+    
+    Args:
+        client: Authorized gspread client
+        month: Month in YYYY-MM format
+        create: If False, return None instead of creating a missing spreadsheet
+    
+    Returns:
+        Tuple of (Spreadsheet, shared tab title -> sheet properties map), or None
+    """
+    title = f"{SHEETS_MONTHLY_TITLE_PREFIX} {month}"
+    folder_id = GOOGLE_DRIVE_FOLDER_ID or None
+    with _cache_lock:
+        cached = _spreadsheets.get(title)
+        if cached is None:
+            try:
+                spreadsheet = client.open(title, folder_id=folder_id)
+            except gspread.exceptions.SpreadsheetNotFound:
+                if not create:
+                    return None
+                spreadsheet = client.create(title, folder_id=folder_id)
+                logger.info(f"Created monthly spreadsheet: {title}")
+                if not folder_id:
+                    for email in EMAIL_TO:
+                        spreadsheet.share(email, perm_type="user", role="writer", notify=False)
+                    logger.info(f"Shared {title} with {', '.join(EMAIL_TO)}")
+            cached = (spreadsheet, {})
+            _spreadsheets[title] = cached
+        return cached
+
+
+def open_spreadsheet(client: gspread.Client, sheet_id: str) -> tuple:
+    """
+    Open a spreadsheet, reusing the process-level cache
+    
+    Args:
+        client: Authorized gspread client
+        sheet_id: Spreadsheet ID
+    
+    Returns:
+        Tuple of (Spreadsheet, shared tab title -> sheet properties map)
+    """
+    with _cache_lock:
+        cached = _spreadsheets.get(sheet_id)
+        if cached is None:
+            cached = (client.open_by_key(sheet_id), {})
+            _spreadsheets[sheet_id] = cached
+        return cached
+
+
+# Title prefix of the per-day tabs ("DOT Leads YYYY-MM-DD")
+TAB_PREFIX = "DOT Leads "
+
+
+class GoogleSheetsHandler:
+    """Handles Google Sheets operations"""
+    
+    def __init__(self):
+        """Initialize Google Sheets client"""
+        try:
+            self.client = get_client(GOOGLE_SHEETS_CREDENTIALS_PATH)
             self.sheet_id = GOOGLE_SHEET_ID
             self.sheet = None
             
-            if self.sheet_id:
-                self.sheet = self.client.open_by_key(self.sheet_id)
+            # Tab title -> sheet properties (gid, grid size), shared across handlers
+            self.tab_properties = {}
+            
+            # Local index of delivered DOT numbers, so dedupe needs no Sheets reads
+            self.dot_index = DOTIndex(DOT_INDEX_PATH) if DOT_INDEX_ENABLED else None
+            
+            # Rows in use (header included) per tab, kept current on every write
+            self.row_counts = {}
+            
+            # Large writes are chunked and paced to stay within Sheets quotas
+            self.writer = SheetsBatchWriter()
+            
+            # Tabs created by this handler whose column sizing is deferred until finalize_daily_tab
+            self.pending_resize = set()
+            
+            # Month (YYYY-MM) of the spreadsheet in use with SHEETS_SHARDING=monthly
+            self.month = None
+            
+            if SHEETS_SHARDING == "monthly":
+                logger.info("Using one spreadsheet per month (SHEETS_SHARDING=monthly)")
+            elif self.sheet_id:
+                self.sheet, self.tab_properties = open_spreadsheet(self.client, self.sheet_id)
                 logger.info(f"Connected to Google Sheet: {self.sheet.title}")
             else:
                 logger.warning("No Google Sheet ID configured")
@@ -44,38 +162,288 @@ class GoogleSheetsHandler:
             logger.error(f"Error initializing Google Sheets client: {str(e)}")
             raise
     
-    def get_existing_dot_numbers(self, worksheet) -> set:
+    def use_spreadsheet_for(self, date: str, create: bool = True) -> bool:
+        """
+        Switch to the month's spreadsheet for a date when sharding monthly (no-op otherwise)
+        
+        Args:
+            date: Date string in YYYY-MM-DD format
+            create: If False, do not create a missing monthly spreadsheet
+        
+        Returns:
+            True if a spreadsheet is in use for the date
+        """
+        if SHEETS_SHARDING != "monthly" or date[:7] == self.month:
+            return self.sheet is not None
+        opened = open_monthly_spreadsheet(self.client, date[:7], create=create)
+        if opened is None:
+            return False
+        self.month = date[:7]
+        self.sheet, self.tab_properties = opened
+        self.sheet_id = self.sheet.id
+        logger.info(f"Connected to Google Sheet: {self.sheet.title}")
+        return True
+    
+    def has_daily_tab(self, date: str) -> bool:
+        """
+        Check whether the tab for a date exists, without creating anything
+        
+        Args:
+            date: Date string in YYYY-MM-DD format
+        
+        Returns:
+            True if the date's tab exists (or is in the local DOT index)
+        """
+        tab_name = f"{TAB_PREFIX}{date}"
+        if not self.use_spreadsheet_for(date, create=False):
+            return False
+        if self.dot_index and self.dot_index.has_tab(self.sheet.id, tab_name):
+            return True
+        try:
+            self.get_worksheet(tab_name)
+            return True
+        except gspread.exceptions.WorksheetNotFound:
+            return False
+    
+    def archive_old_tabs(self) -> List[str]:
+        """
+        Move daily tabs older than SHEETS_ARCHIVE_AFTER_DAYS to gzip CSV files and delete them
+        
+        Keeps the number of tabs (and cells) in the spreadsheet bounded. Each
+        old tab is read once, written to SHEETS_ARCHIVE_DIR, and all of them
+        are then deleted in a single batchUpdate. Tabs created by this process
+        are skipped, so a backfill of old dates keeps the tabs it delivers.
+        
+        Returns:
+            Titles of the archived tabs
+        """
+        cutoff = (datetime.now() - timedelta(days=SHEETS_ARCHIVE_AFTER_DAYS)).strftime(DATE_FORMAT)
+        old_tabs = []
+        for title in list(self.tab_properties):
+            if not title.startswith(TAB_PREFIX) or (self.sheet.id, title) in _created_tabs:
+                continue
+            tab_date = title[len(TAB_PREFIX):]
+            try:
+                datetime.strptime(tab_date, DATE_FORMAT)
+            except ValueError:
+                continue
+            if tab_date < cutoff:
+                old_tabs.append(title)
+        
+        if not old_tabs:
+            return []
+        
+        ensure_output_directory(SHEETS_ARCHIVE_DIR)
+        for title in old_tabs:
+            worksheet = self.get_worksheet(title)
+            rows = self.writer.execute(worksheet.get_all_values)
+            path = os.path.join(SHEETS_ARCHIVE_DIR, f"dot_leads_{title[len(TAB_PREFIX):]}_sheet.csv.gz")
+            tmp_path = f"{path}.tmp"
+            with gzip.open(tmp_path, 'wt', newline='', encoding='utf-8') as f:
+                csv.writer(f).writerows(rows)
+            os.replace(tmp_path, path)
+            logger.info(f"Archived tab '{title}' ({max(len(rows) - 1, 0)} records) to {path}")
+        
+        self.writer.execute(self.sheet.batch_update, {"requests": [
+            {"deleteSheet": {"sheetId": self.tab_properties[title]["sheetId"]}} for title in old_tabs
+        ]})
+        for title in old_tabs:
+            self.tab_properties.pop(title, None)
+            self.row_counts.pop(title, None)
+            if self.dot_index:
+                self.dot_index.forget_tab(self.sheet.id, title)
+        
+        logger.info(f"Deleted {len(old_tabs)} archived tabs older than {cutoff}")
+        return old_tabs
+    
+    def refresh_tab_map(self) -> None:
+        """Reload the tab title -> properties map from the spreadsheet metadata (one request)"""
+        metadata = self.writer.execute(self.sheet.fetch_sheet_metadata)
+        self.tab_properties.clear()
+        for sheet in metadata.get("sheets", []):
+            properties = sheet["properties"]
+            self.tab_properties[properties["title"]] = properties
+    
+    def get_worksheet(self, tab_name: str):
+        """
+        Get a worksheet by title from the cached tab map
+        
+        Metadata is only fetched when the title is not in the map yet, so
+        repeated lookups (and later runs in the same process) cost no request.
+        
+        Args:
+            tab_name: Worksheet title
+        
+        Returns:
+            Worksheet object
+        
+        Raises:
+            gspread.exceptions.WorksheetNotFound: If the spreadsheet has no such tab
+        """
+        properties = self.tab_properties.get(tab_name)
+        if properties is None:
+            self.refresh_tab_map()
+            properties = self.tab_properties.get(tab_name)
+            if properties is None:
+                raise gspread.exceptions.WorksheetNotFound(tab_name)
+        return gspread.Worksheet(self.sheet, properties, self.sheet.id, self.sheet.client)
+    
+    def get_existing_dot_numbers(self, worksheet, refresh: bool = False) -> set:
         """
         Get existing DOT numbers from the worksheet
         
+        Served from the local DOT index when the tab is indexed; otherwise
+        (or with ``refresh``) the sheet is read and the index rebuilt from it.
+        
         Args:
             worksheet: Google Sheets worksheet object
+            refresh: If True, ignore the index and re-read the sheet
         
         Returns:
             Set of existing DOT numbers
         """
+        if self.dot_index and not refresh and self.dot_index.has_tab(self.sheet.id, worksheet.title):
+            existing_dots = self.dot_index.get_dot_numbers(self.sheet.id, worksheet.title)
+            logger.info(f"Found {len(existing_dots)} existing DOT numbers in local index")
+            return existing_dots
+        
         try:
-            # Get all values from the sheet (skip header row)
-            all_values = worksheet.get_all_values()
-            if len(all_values) <= 1:
-                return set()
-            
-            # Extract DOT numbers from first column (skip header)
+            # Only the DOT Number column is needed
             existing_dots = set()
-            for row in all_values[1:]:  # Skip header row
-                if row and row[0]:  # Check if row has data and DOT number exists
-                    dot_number = str(row[0]).strip()
-                    if dot_number:
-                        existing_dots.add(dot_number)
+            for value in self.read_dot_column(worksheet):
+                dot_number = str(value).strip()
+                if dot_number:
+                    existing_dots.add(dot_number)
             
             logger.info(f"Found {len(existing_dots)} existing DOT numbers in sheet")
-            return existing_dots
             
         except Exception as e:
             logger.warning(f"Error reading existing data: {str(e)}. Treating as empty sheet.")
             return set()
+        
+        if self.dot_index:
+            self.dot_index.rebuild_tab(self.sheet.id, worksheet.title, existing_dots,
+                                       self.row_counts[worksheet.title])
+        return existing_dots
+    
+    def read_dot_column(self, worksheet) -> List[str]:
+        """
+        Read the DOT Number column below the header in paged ``A2:A{n}`` ranges
+        
+        Transfers one column instead of the full row width, and very large tabs
+        are fetched SHEETS_READ_PAGE_ROWS rows per request. Also refreshes the
+        cached row count of the tab.
+        
+        Args:
+            worksheet: Google Sheets worksheet object
+        
+        Returns:
+            Column A values from row 2 down to the last non-empty row ("" for blank cells)
+        """
+        values = []
+        start = 2
+        while True:
+            # Ranges past the end of the grid are clipped by the API, so the
+            # (possibly cached, stale) grid size is not needed as a bound
+            end = start + SHEETS_READ_PAGE_ROWS - 1
+            page = worksheet.get(f"A{start}:A{end}")
+            values.extend(row[0] if row else "" for row in page)
+            
+            # The API omits trailing empty rows, so a short page is the end of the data
+            if len(page) < end - start + 1:
+                break
+            start = end + 1
+        
+        self.row_counts[worksheet.title] = len(values) + 1
+        return values
+    
+    def get_row_count(self, worksheet) -> int:
+        """
+        Get the number of rows in use in a tab (header included)
+        
+        Served from the cache maintained by reads and writes of this handler,
+        then from the local DOT index; only a tab neither has seen costs a
+        (column-only) read.
+        
+        Args:
+            worksheet: Google Sheets worksheet object
+        
+        Returns:
+            Row count
+        """
+        if worksheet.title not in self.row_counts:
+            row_count = self.dot_index.get_row_count(self.sheet.id, worksheet.title) if self.dot_index else None
+            if row_count is None:
+                self.read_dot_column(worksheet)
+            else:
+                self.row_counts[worksheet.title] = row_count
+        return self.row_counts[worksheet.title]
+    
+    def _record_written(self, worksheet, records: List[DOTRecord]) -> None:
+        """Book-keeping after a chunk of records is acknowledged: DOT index and row count"""
+        self._index_records(worksheet.title, records)
+        self.row_counts[worksheet.title] += len(records)
+    
+    def _append_rows(self, worksheet, records: List[DOTRecord]) -> None:
+        """
+        Write records below the last row in use
+        
+        Every chunk goes to a fixed range computed from the tracked row count
+        rather than through values.append, so a chunk retried after a timeout
+        that was in fact applied overwrites itself instead of duplicating rows.
+        The grid is grown to an absolute size first, which is just as safe to
+        retry.
+        
+        Args:
+            worksheet: Google Sheets worksheet object
+            records: Records to write
+        """
+        if not records:
+            return
+        start_row = self.get_row_count(worksheet) + 1
+        last_row = start_row + len(records) - 1
+        if worksheet.row_count < last_row:
+            # Headroom of one chunk saves a resize per batch when streaming
+            self.writer.execute(worksheet.resize, rows=last_row + self.writer.chunk_rows)
+        self.writer.write_rows(worksheet, records, start_row=start_row,
+                               on_chunk=partial(self._record_written, worksheet))
+    
+    def rebuild_dot_index(self) -> int:
+        """
+        Rebuild the local DOT index from every daily tab in the spreadsheet
+        
+        With monthly sharding, the current month's spreadsheet is used.
+        
+        Returns:
+            Number of tabs indexed
+        """
+        self.use_spreadsheet_for(datetime.now().strftime(DATE_FORMAT))
+        if not self.sheet:
+            raise ValueError("Google Sheet not initialized")
+        if not self.dot_index:
+            raise ValueError("DOT index is disabled (DOT_INDEX_ENABLED=false)")
+        
+        tab_count = 0
+        self.refresh_tab_map()
+        for tab_name in list(self.tab_properties):
+            if tab_name.startswith(TAB_PREFIX):
+                self.get_existing_dot_numbers(self.get_worksheet(tab_name), refresh=True)
+                tab_count += 1
+        
+        logger.info(f"Rebuilt DOT index from {tab_count} tabs")
+        return tab_count
     
-    def create_daily_tab(self, date: str, records: List[Dict]) -> tuple:
+    def _index_records(self, tab_name: str, records: List[DOTRecord], replace: bool = False) -> None:
+        """Record appended records and rows in the local DOT index (``replace`` for a freshly written tab)"""
+        if not self.dot_index:
+            return
+        dot_numbers = (record.dot_number for record in records)
+        if replace:
+            self.dot_index.rebuild_tab(self.sheet.id, tab_name, dot_numbers, row_count=len(records) + 1)
+        else:
+            self.dot_index.add(self.sheet.id, tab_name, dot_numbers, row_count=len(records))
+    
+    def create_daily_tab(self, date: str, records: List[DOTRecord]) -> tuple:
         """
         Create or update a tab for the given date and add only new records
         
@@ -86,6 +454,7 @@ class GoogleSheetsHandler:
         Returns:
             Tuple of (URL to the sheet tab, new_records list, existing_count)
         """
+        self.use_spreadsheet_for(date)
         if not self.sheet:
             raise ValueError("Google Sheet not initialized")
         
@@ -94,77 +463,280 @@ class GoogleSheetsHandler:
         try:
             # Check if tab already exists
             try:
-                worksheet = self.sheet.worksheet(tab_name)
+                worksheet = self.get_worksheet(tab_name)
                 logger.info(f"Tab '{tab_name}' already exists")
                 
                 # Get existing DOT numbers
                 existing_dots = self.get_existing_dot_numbers(worksheet)
                 
                 # Filter out records that already exist
-                new_records = []
-                for record in records:
-                    dot_number = str(record.get("dot_number", "")).strip()
-                    if dot_number and dot_number not in existing_dots:
-                        new_records.append(record)
+                new_records = DataProcessor.filter_new_records(records, set(existing_dots))
                 
                 logger.info(f"Found {len(new_records)} new records out of {len(records)} total")
                 
                 if new_records:
-                    # Get current data to append new records
-                    all_values = worksheet.get_all_values()
-                    current_row_count = len(all_values)
-                    
-                    # Format new records for output (without headers)
-                    new_rows = DataProcessor.format_for_output(new_records)
-                    # Remove header row since we're appending
-                    new_rows = new_rows[1:]
-                    
-                    # Append new records
-                    if new_rows:
-                        worksheet.append_rows(new_rows)
-                        logger.info(f"Added {len(new_rows)} new records to existing tab")
+                    # Records are already rows; append them without headers
+                    self._append_rows(worksheet, new_records)
+                    logger.info(f"Added {len(new_records)} new records to existing tab")
                 else:
                     logger.info("No new records to add - all records already exist")
                 
                 existing_count = len(existing_dots)
                 
             except gspread.exceptions.WorksheetNotFound:
-                # Create new worksheet
-                worksheet = self.sheet.add_worksheet(
-                    title=tab_name,
-                    rows=len(records) + 100,
-                    cols=10
-                )
-                logger.info(f"Created new tab: {tab_name}")
-                
-                # Format data for output
-                rows = DataProcessor.format_for_output(records)
-                
-                # Write data to sheet
-                worksheet.update('A1', rows)
+                # One request creates the tab with the header and first chunk,
+                # styled and sized; any further chunks go to fixed ranges. Each
+                # acknowledged chunk is indexed, so a failed upload resumes
+                # through the existing-tab branch with only the missing rows
+                first_chunk = records[:self.writer.chunk_rows]
+                worksheet = self.create_tab(tab_name, first_chunk, row_capacity=len(records) + 100)
+                self._append_rows(worksheet, records[len(first_chunk):])
                 
                 # All records are new for a new tab
                 new_records = records
                 existing_count = 0
                 logger.info(f"Populated new tab '{tab_name}' with {len(records)} records")
             
-            # Format header row (bold)
-            worksheet.format('A1:I1', {
-                'textFormat': {'bold': True},
-                'backgroundColor': {'red': 0.9, 'green': 0.9, 'blue': 0.9}
-            })
-            
-            # Auto-resize columns
-            worksheet.columns_auto_resize(0, 9)
-            
-            # Return URL to the worksheet
-            sheet_url = f"https://docs.google.com/spreadsheets/d/{self.sheet_id}/edit#gid={worksheet.id}"
+            sheet_url = self.get_tab_url(worksheet)
             return sheet_url, new_records, existing_count
             
         except Exception as e:
             logger.error(f"Error creating/updating tab '{tab_name}': {str(e)}")
+            # The cached tab map may be stale (e.g. tab deleted by hand); reload it next time
+            self.tab_properties.clear()
+            raise
+    
+    def get_dot_row_map(self, worksheet) -> Dict[str, int]:
+        """
+        Map each DOT number in the worksheet to its 1-based row number
+        
+        Args:
+            worksheet: Google Sheets worksheet object
+        
+        Returns:
+            Dict of DOT number to sheet row number (header excluded)
+        """
+        row_map = {}
+        for index, value in enumerate(self.read_dot_column(worksheet), start=2):
+            dot_number = str(value).strip()
+            if dot_number and dot_number not in row_map:
+                row_map[dot_number] = index
+        return row_map
+    
+    def upsert_records(self, date: str, records: List[DOTRecord]) -> tuple:
+        """
+        Update rows already in the date's tab and append the rest
+        
+        Used by incremental sync, where changed carriers (new phone, address,
+        ...) must overwrite their existing row instead of being skipped. The
+        tab must already exist (see has_daily_tab); sync never creates tabs.
+        
+        Args:
+            date: Date string in YYYY-MM-DD format (the records' add_date)
+            records: Processed DOT records
+        
+        Returns:
+            Tuple of (URL to the sheet tab, new_records list, updated_count)
+        """
+        self.use_spreadsheet_for(date)
+        if not self.sheet:
+            raise ValueError("Google Sheet not initialized")
+        
+        tab_name = f"DOT Leads {date}"
+        
+        try:
+            worksheet = self.get_worksheet(tab_name)
+            row_map = self.get_dot_row_map(worksheet)
+            updates = []
+            new_records = []
+            for record in records:
+                row_number = row_map.get(record.dot_number)
+                if row_number:
+                    updates.append({
+                        'range': f"A{row_number}:I{row_number}",
+                        'values': [list(record)]
+                    })
+                else:
+                    new_records.append(record)
+            
+            if updates:
+                self.writer.write_updates(worksheet, updates)
+            self._append_rows(worksheet, new_records)
+            
+            logger.info(f"Upserted tab '{tab_name}': {len(updates)} updated, {len(new_records)} added")
+            sheet_url = self.get_tab_url(worksheet)
+            return sheet_url, new_records, len(updates)
+            
+        except Exception as e:
+            logger.error(f"Error upserting tab '{tab_name}': {str(e)}")
+            # The cached tab map may be stale (e.g. tab deleted by hand); reload it next time
+            self.tab_properties.clear()
             raise
     
+    def open_daily_tab(self, date: str) -> tuple:
+        """
+        Open the tab for the given date for incremental appends, creating it if needed
+        
+        A newly created tab gets the header row immediately so that batches
+        can be appended with ``append_new_records`` as they are processed.
+        
+        Args:
+            date: Date string in YYYY-MM-DD format
+        
+        Returns:
+            Tuple of (worksheet, set of existing DOT numbers, existing_count)
+        """
+        self.use_spreadsheet_for(date)
+        if not self.sheet:
+            raise ValueError("Google Sheet not initialized")
+        
+        tab_name = f"DOT Leads {date}"
+        
+        try:
+            try:
+                worksheet = self.get_worksheet(tab_name)
+                logger.info(f"Tab '{tab_name}' already exists")
+                existing_dots = self.get_existing_dot_numbers(worksheet)
+            except gspread.exceptions.WorksheetNotFound:
+                # Columns are sized by finalize_daily_tab once the data is in
+                worksheet = self.create_tab(tab_name, [], row_capacity=100, resize=False)
+                existing_dots = set()
+            
+            return worksheet, existing_dots, len(existing_dots)
+            
+        except Exception as e:
+            logger.error(f"Error opening tab '{tab_name}': {str(e)}")
+            # The cached tab map may be stale (e.g. tab deleted by hand); reload it next time
+            self.tab_properties.clear()
+            raise
+    
+    def append_new_records(self, worksheet, records: List[DOTRecord], existing_dots: Set[str]) -> List[DOTRecord]:
+        """
+        Append the records of one batch that are not yet in the tab
+        
+        Args:
+            worksheet: Worksheet returned by ``open_daily_tab``
+            records: Processed DOT records for this batch
+            existing_dots: DOT numbers already in the tab (updated in place)
+        
+        Returns:
+            List of records that were appended
+        """
+        new_records = DataProcessor.filter_new_records(records, existing_dots)
+        if new_records:
+            self._append_rows(worksheet, new_records)
+            logger.info(f"Appended {len(new_records)} new records to tab '{worksheet.title}'")
+        return new_records
+    
+    def create_tab(self, tab_name: str, records: List[DOTRecord], row_capacity: int, resize: bool = True):
+        """
+        Create a daily tab with a single spreadsheets.batchUpdate request
+        
+        The request adds the sheet (header row frozen), writes the header and
+        ``records``, styles the header and, with ``resize``, auto-sizes the
+        columns, so a new tab costs one round trip instead of four.
+        
+        Args:
+            tab_name: Worksheet title
+            records: Records written below the header in the same request
+            row_capacity: Number of grid rows to allocate
+            resize: If False, column sizing is deferred to finalize_daily_tab
+        
+        Returns:
+            The new worksheet
+        """
+        headers = DataProcessor.get_column_headers()
+        column_count = len(headers)
+        
+        # Choosing the sheetId up front lets the other requests in the batch target the new tab.
+        # Callers get here after get_worksheet missed and refreshed the tab map, so
+        # probing past the ids in it avoids colliding with an existing (e.g. renamed) tab
+        used_ids = {properties["sheetId"] for properties in self.tab_properties.values()}
+        sheet_id = zlib.crc32(tab_name.encode("utf-8")) & 0x7FFFFFFF
+        while sheet_id in used_ids:
+            sheet_id = (sheet_id + 1) & 0x7FFFFFFF
+        
+        rows = [
+            {"values": [{"userEnteredValue": {"stringValue": value}} if value else {} for value in row]}
+            for row in [headers, *records]
+        ]
+        requests = [
+            {"addSheet": {"properties": {
+                "sheetId": sheet_id,
+                "title": tab_name,
+                "sheetType": "GRID",
+                "gridProperties": {"rowCount": row_capacity, "columnCount": 10, "frozenRowCount": 1}
+            }}},
+            {"updateCells": {
+                "start": {"sheetId": sheet_id, "rowIndex": 0, "columnIndex": 0},
+                "rows": rows,
+                "fields": "userEnteredValue"
+            }},
+            {"repeatCell": {
+                "range": {"sheetId": sheet_id, "startRowIndex": 0, "endRowIndex": 1,
+                          "startColumnIndex": 0, "endColumnIndex": column_count},
+                "cell": {"userEnteredFormat": {
+                    "textFormat": {"bold": True},
+                    "backgroundColor": {"red": 0.9, "green": 0.9, "blue": 0.9}
+                }},
+                "fields": "userEnteredFormat(textFormat,backgroundColor)"
+            }}
+        ]
+        if resize:
+            requests.append(self._auto_resize_request(sheet_id, column_count))
+        else:
+            self.pending_resize.add(tab_name)
+        
+        response = self.writer.execute(self.sheet.batch_update, {"requests": requests})
+        properties = response["replies"][0]["addSheet"]["properties"]
+        self.tab_properties[tab_name] = properties
+        worksheet = gspread.Worksheet(self.sheet, properties, self.sheet.id, self.sheet.client)
+        logger.info(f"Created new tab: {tab_name}")
+        
+        self._index_records(tab_name, records, replace=True)
+        self.row_counts[tab_name] = len(rows)
+        _created_tabs.add((self.sheet.id, tab_name))
+        
+        # A new tab is the natural point to rotate old ones out
+        if SHEETS_SHARDING == "archive":
+            self.archive_old_tabs()
+        return worksheet
+    
+    @staticmethod
+    def _auto_resize_request(sheet_id: int, column_count: int) -> Dict:
+        return {"autoResizeDimensions": {"dimensions": {
+            "sheetId": sheet_id, "dimension": "COLUMNS", "startIndex": 0, "endIndex": column_count
+        }}}
+    
+    def finalize_daily_tab(self, worksheet) -> str:
+        """
+        Size the columns of a tab created with deferred sizing and return its URL
+        
+        Tabs that already existed keep their styling and cost no request.
+        
+        Args:
+            worksheet: Google Sheets worksheet object
+        
+        Returns:
+            URL to the worksheet
+        """
+        if worksheet.title in self.pending_resize:
+            column_count = len(DataProcessor.get_column_headers())
+            self.writer.execute(self.sheet.batch_update,
+                                {"requests": [self._auto_resize_request(worksheet.id, column_count)]})
+            self.pending_resize.discard(worksheet.title)
+        
+        return self.get_tab_url(worksheet)
+    
+    def get_tab_url(self, worksheet) -> str:
+        """Get the URL of a worksheet"""
+        return f"https://docs.google.com/spreadsheets/d/{self.sheet_id}/edit#gid={worksheet.id}"
+    
     def get_sheet_url(self) -> str:
         """Get the base URL of the Google Sheet"""
         return f"https://docs.google.com/spreadsheets/d/{self.sheet_id}/edit"
+    
+    def close(self) -> None:
+        """Close the local DOT index (the client and spreadsheet stay cached for the process)"""
+        if self.dot_index:
+            self.dot_index.close()
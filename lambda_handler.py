@@ -15,7 +15,8 @@ def lambda_handler(event, context):
     AWS Lambda handler function
     
     Args:
-        event: Lambda event (can contain 'date' key for specific date)
+        event: Lambda event (can contain 'date' key for specific date, or
+               'start_date' and 'end_date' keys for a backfill range)
         context: Lambda context
     
     Returns:
@@ -24,11 +25,16 @@ def lambda_handler(event, context):
     try:
         # Extract target date from event if provided
         target_date = event.get('date') if isinstance(event, dict) else None
+        start_date = event.get('start_date') if isinstance(event, dict) else None
+        end_date = event.get('end_date') if isinstance(event, dict) else None
         
-        logger.info(f"Lambda invoked for date: {target_date or 'yesterday'}")
+        if start_date or end_date:
+            logger.info(f"Lambda invoked for date range: {start_date} to {end_date}")
+        else:
+            logger.info(f"Lambda invoked for date: {target_date or 'yesterday'}")
         
         # Run the main automation
-        main(target_date=target_date)
+        main(target_date=target_date, start_date=start_date, end_date=end_date)
         
         return {
             'statusCode': 200,
@@ -5,35 +5,472 @@ Main entry point for FMCSA DOT Leads Automation
 import sys
 import logging
 from datetime import datetime, timedelta
-from typing import Optional
-from config import DATE_FORMAT
+from itertools import chain
+from typing import List, Optional
+from config import (
+    DATE_FORMAT, STREAM_PAGES, SYNC_STATE_PATH, SYNC_INITIAL_LOOKBACK_DAYS, CHECKPOINT_RUNS, RUN_MANIFEST_DIR,
+    GLOBAL_DEDUPE_ENABLED, DELIVERED_STORE_PATH, DELIVERED_BLOOM_CAPACITY, DELIVERED_BLOOM_ERROR_RATE
+)
 from dot_fetcher import DOTFetcher
-from data_processor import DataProcessor
-from google_sheets_handler import GoogleSheetsHandler
+from data_processor import DataProcessor, DOTRecord
+from output_sinks import create_sink
 from csv_handler import CSVHandler
-from email_handler import EmailHandler
+from email_handler import EmailHandler, close_smtp_connections
+from sync_state import SyncState
+from run_manifest import RunManifest
+from delivered_store import DeliveredStore
 
 logger = logging.getLogger(__name__)
 
 
-def main(target_date: Optional[str] = None):
+def log_summary(target_date: str, total_count: int, new_count: int, existing_count: int,
+                sheet_url: Optional[str], csv_path_all: str, csv_path_new: Optional[str]) -> None:
+    """Log the end-of-run summary for one date"""
+    logger.info(f"Successfully completed DOT Leads Automation for {target_date}")
+    logger.info(f"Total records found: {total_count}")
+    logger.info(f"New records added: {new_count}")
+    logger.info(f"Existing records: {existing_count}")
+    if sheet_url:
+        logger.info(f"Google Sheet: {sheet_url}")
+    if csv_path_new:
+        logger.info(f"New records CSV: {csv_path_new}")
+    logger.info(f"All records CSV: {csv_path_all}")
+
+
+def open_delivered_store() -> Optional[DeliveredStore]:
+    """Open the global delivered-DOT store, or return None if global dedupe is disabled"""
+    if not GLOBAL_DEDUPE_ENABLED:
+        return None
+    return DeliveredStore(DELIVERED_STORE_PATH, DELIVERED_BLOOM_CAPACITY, DELIVERED_BLOOM_ERROR_RATE)
+
+
+def deliver_records(target_date: str, processed_records: List[DOTRecord], sink,
+                    csv_handler: CSVHandler, email_handler: EmailHandler,
+                    manifest: Optional[RunManifest] = None,
+                    delivered_store: Optional[DeliveredStore] = None) -> None:
+    """
+    Deliver processed records for one date: Google Sheet tab, CSV files and email
+    
+    When a run manifest is given, stages it records as completed are skipped
+    and their results reused, and each stage is checkpointed as it finishes.
+    
+    Args:
+        target_date: Date in YYYY-MM-DD format
+        processed_records: Processed and deduplicated records for that date
+        sink: Output sink from create_sink, e.g. GoogleSheetsHandler (may be
+              None if the manifest shows the Sheets stage is already done)
+        csv_handler: CSVHandler
+        email_handler: EmailHandler
+        manifest: Optional RunManifest for the date
+        delivered_store: Optional global store; records already delivered on
+                         another date are kept out of the sheet and the "_new"
+                         CSV, while the "_all" backup still holds every record
+    """
+    deliverable_records = processed_records
+    if delivered_store:
+        deliverable_records = DataProcessor.filter_delivered(processed_records, delivered_store, target_date)
+    
+    # Step 3: Upload to Google Sheets and get only new records
+    if not deliverable_records:
+        # Still back up and report the day, so repeats are not mistaken for a failed run
+        logger.info(f"Step 3: Skipped - all records for {target_date} were already delivered on other dates")
+        sheet_url, new_records, existing_count = None, [], 0
+    elif manifest and manifest.is_done("sheets"):
+        logger.info("Step 3: Skipped - Google Sheet already updated by an earlier attempt")
+        sheets_stage = manifest.get("sheets")
+        sheet_url = sheets_stage["sheet_url"]
+        existing_count = sheets_stage["existing_count"]
+        new_dots = set(sheets_stage["new_dot_numbers"])
+        new_records = [record for record in deliverable_records if record.dot_number in new_dots]
+    else:
+        logger.info("Step 3: Checking Google Sheet for existing records...")
+        sheet_url, new_records, existing_count = sink.create_daily_tab(target_date, deliverable_records)
+        if manifest:
+            manifest.complete(
+                "sheets",
+                sheet_url=sheet_url,
+                existing_count=existing_count,
+                rows_written=len(new_records),
+                new_dot_numbers=[record.dot_number for record in new_records]
+            )
+    
+    if delivered_store:
+        delivered_store.mark_delivered((record.dot_number for record in deliverable_records), target_date)
+        # Records delivered on other dates count as existing, so new + existing = total
+        existing_count += len(processed_records) - len(deliverable_records)
+    
+    logger.info(f"Comparison results: {len(new_records)} new, {existing_count} existing, {len(processed_records)} total")
+    
+    # Step 4: Save CSV files
+    if manifest and manifest.is_done("csv"):
+        logger.info("Step 4: Skipped - CSV files already written by an earlier attempt")
+        csv_path_all = manifest.get("csv")["all"]
+        csv_path_new = manifest.get("csv")["new"]
+    else:
+        logger.info("Step 4: Saving records to CSV...")
+        
+        # All records (backup) and only new records (for email attachment) in one pass
+        csv_path_all, csv_path_new = csv_handler.save_all_and_new(
+            processed_records, {record.dot_number for record in new_records}, target_date
+        )
+        if not csv_path_new:
+            logger.info("No new records to save - all records already exist")
+        
+        if manifest:
+            manifest.complete("csv", all=csv_path_all, new=csv_path_new)
+    
+    # Step 5: Send email notification with only new records
+    if manifest and manifest.is_done("email"):
+        logger.info("Step 5: Skipped - email already sent by an earlier attempt")
+    else:
+        logger.info("Step 5: Sending email notification...")
+        sent = email_handler.send_daily_report(
+            date=target_date,
+            new_record_count=len(new_records),
+            total_record_count=len(processed_records),
+            existing_count=existing_count,
+            sheet_url=sheet_url,
+            csv_path=csv_path_new  # Only attach CSV with new records
+        )
+        if manifest:
+            if sent:
+                manifest.complete("email", sent=True)
+            else:
+                logger.warning(f"Daily report for {target_date} was not sent; the next run for this date will retry it")
+    
+    # Page artifacts are kept until every stage is done, so a retry can reuse them
+    if manifest and manifest.is_done("email"):
+        manifest.cleanup()
+    
+    log_summary(target_date, len(processed_records), len(new_records), existing_count,
+                sheet_url, csv_path_all, csv_path_new)
+
+
+def fetch_with_checkpoints(dot_fetcher: DOTFetcher, target_date: str, manifest: RunManifest) -> List[DOTRecord]:
+    """
+    Fetch and process a date's records, checkpointing every page
+    
+    Processed pages are persisted through the manifest as they arrive; an
+    interrupted fetch resumes after the last checkpointed dot_number, and a
+    completed one is loaded from disk without any API calls.
+    
+    Args:
+        dot_fetcher: Open DOTFetcher
+        target_date: Date in YYYY-MM-DD format
+        manifest: RunManifest for the date
+    
+    Returns:
+        Processed and deduplicated records
+    """
+    # Range runs complete the stage without pages, since their query refetches anyway
+    if manifest.is_done("fetched") and manifest.get("fetched").get("pages"):
+        logger.info("Step 1-2: Skipped - reusing processed records from an earlier attempt")
+        return manifest.load_processed()
+    
+    after_dot_number = manifest.get("fetched").get("last_dot_number")
+    if after_dot_number:
+        logger.info(f"Step 1-2: Resuming fetch after DOT number {after_dot_number}...")
+    else:
+        logger.info("Step 1-2: Fetching and processing DOT records from Socrata API...")
+    
+    pages = dot_fetcher.iter_new_dots(target_date, after_dot_number=after_dot_number)
+    for batch in DataProcessor.iter_process_records(pages):
+        manifest.record_page(batch, dot_fetcher.last_dot_number)
+    
+    processed_records = manifest.load_processed()
+    manifest.complete("fetched", record_count=len(processed_records))
+    return processed_records
+
+
+def run_range(dot_fetcher: DOTFetcher, start_date: str, end_date: str,
+              delivered_store: Optional[DeliveredStore] = None) -> None:
+    """
+    Fetch a date range with one paged query and deliver each day separately
+    
+    Records are processed page by page, split by add_date in memory and then
+    delivered per day over a single Socrata client, Sheets session and
+    email handler.
+    
+    Args:
+        dot_fetcher: Open DOTFetcher
+        start_date: First date in YYYY-MM-DD format
+        end_date: Last date in YYYY-MM-DD format
+        delivered_store: Optional global store for cross-day deduplication
+    """
+    # Steps 1-2: Fetch the whole range and process page by page
+    logger.info("Step 1-2: Fetching and processing DOT records for the date range...")
+    batches = DataProcessor.iter_process_records(dot_fetcher.iter_dots_in_range(start_date, end_date))
+    records_by_date = DataProcessor.group_by_add_date(batches)
+    
+    if not records_by_date:
+        logger.info(f"No new DOT records found between {start_date} and {end_date}")
+        return
+    
+    logger.info(f"Processed records for {len(records_by_date)} day(s): "
+                f"{sum(len(records) for records in records_by_date.values())} unique records")
+    
+    sink = create_sink()
+    csv_handler = CSVHandler()
+    email_handler = EmailHandler()
+    
+    try:
+        for target_date, processed_records in records_by_date.items():
+            logger.info(f"Delivering {len(processed_records)} records for {target_date}")
+            manifest = None
+            if CHECKPOINT_RUNS:
+                # Only the sheets/csv/email stages are checkpointed: a resumed
+                # range run refetches the range, so pages would never be read
+                manifest = RunManifest(target_date, RUN_MANIFEST_DIR)
+                if not manifest.is_done("fetched"):
+                    manifest.complete("fetched", record_count=len(processed_records))
+            deliver_records(target_date, processed_records, sink, csv_handler, email_handler, manifest,
+                            delivered_store)
+    finally:
+        sink.close()
+
+
+def run_sync(dot_fetcher: DOTFetcher, sync_state: SyncState) -> None:
+    """
+    Pull only records changed since the last successful run and upsert them
+    
+    Uses the Socrata system field :updated_at as a persisted high-water mark,
+    so daily transfer is proportional to the number of changed carriers.
+    The watermark only advances after every output has been written.
+    
+    Args:
+        dot_fetcher: Open DOTFetcher
+        sync_state: Persisted sync state holding the watermark
+    """
+    since = sync_state.get_watermark(SYNC_INITIAL_LOOKBACK_DAYS)
+    high_water = since
+    
+    def track_watermark(pages):
+        nonlocal high_water
+        for page in pages:
+            for record in page:
+                updated_at = record.get(":updated_at")
+                if updated_at and updated_at > high_water:
+                    high_water = updated_at
+            yield page
+    
+    # Steps 1-2: Fetch changed records and process them
+    logger.info("Step 1-2: Fetching and processing records changed since the last sync...")
+    batches = DataProcessor.iter_process_records(track_watermark(dot_fetcher.iter_updated_since(since)))
+    records_by_date = DataProcessor.group_by_add_date(batches)
+    
+    if not records_by_date:
+        logger.info(f"No DOT records changed since {since}")
+        return
+    
+    # Steps 3-4: Upsert each add_date into its tab and backup CSV
+    logger.info("Step 3-4: Upserting changed records into Google Sheet and CSV...")
+    sink = create_sink()
+    csv_handler = CSVHandler()
+    results = []
+    skipped_dates = []
+    
+    try:
+        for target_date, processed_records in records_by_date.items():
+            # Only dates that were delivered are kept current; a change to a
+            # carrier from an undelivered (e.g. years old) date creates nothing
+            if not sink.has_daily_tab(target_date):
+                skipped_dates.append(target_date)
+                continue
+            sheet_url, new_records, updated_count = sink.upsert_records(target_date, processed_records)
+            csv_handler.upsert_records(processed_records, target_date, "_all")
+            results.append((target_date, len(new_records), updated_count, sheet_url))
+    finally:
+        sink.close()
+    
+    if skipped_dates:
+        skipped_count = sum(len(records_by_date[date]) for date in skipped_dates)
+        logger.info(f"Skipped {skipped_count} changed records for {len(skipped_dates)} add date(s) "
+                    f"with no delivered tab ({min(skipped_dates)} to {max(skipped_dates)})")
+    
+    # Step 5: Send sync report
+    logger.info("Step 5: Sending sync report...")
+    email_handler = EmailHandler()
+    email_handler.send_sync_report(since, high_water, results)
+    
+    sync_state.set_watermark(high_water)
+    logger.info(f"Successfully completed incremental sync through {high_water}")
+    for target_date, new_count, updated_count, sheet_url in results:
+        logger.info(f"{target_date}: {new_count} new, {updated_count} updated ({sheet_url})")
+
+
+def run_streaming(dot_fetcher: DOTFetcher, target_date: str,
+                  delivered_store: Optional[DeliveredStore] = None) -> None:
+    """
+    Fetch, process, and deliver DOT leads one API page at a time
+    
+    Each page is processed, appended to the Google Sheet and written to the
+    CSV files before the next page is requested, so peak memory stays at
+    roughly one page regardless of how many records the date has.
+    
+    Args:
+        dot_fetcher: Open DOTFetcher
+        target_date: Date in YYYY-MM-DD format
+        delivered_store: Optional global store for cross-day deduplication
+    """
+    # Steps 1-2: Fetch and process pages lazily
+    logger.info("Step 1-2: Streaming DOT records from Socrata API...")
+    batches = DataProcessor.iter_process_records(dot_fetcher.iter_new_dots(target_date))
+    
+    first_batch = next(batches, None)
+    if first_batch is None:
+        logger.info(f"No new DOT records found for {target_date}")
+        return
+    
+    # Steps 3-4: Append each batch to Google Sheets and the CSV files
+    logger.info("Step 3-4: Streaming records to Google Sheet and CSV...")
+    sink = create_sink()
+    try:
+        worksheet, existing_dots, existing_count = sink.open_daily_tab(target_date)
+        
+        csv_handler = CSVHandler()
+        total_count = 0
+        new_count = 0
+        
+        with csv_handler.open_writer(target_date, "_all") as all_writer, \
+                csv_handler.open_writer(target_date, "_new") as new_writer, \
+                csv_handler.open_archive_writer(target_date) as archive_writer:
+            for batch in chain([first_batch], batches):
+                all_writer.write(batch)
+                if archive_writer:
+                    archive_writer.write(batch)
+                total_count += len(batch)
+                # Records delivered on other dates stay in the "_all" backup only
+                if delivered_store:
+                    deliverable = DataProcessor.filter_delivered(batch, delivered_store, target_date)
+                    existing_count += len(batch) - len(deliverable)
+                    batch = deliverable
+                new_records = sink.append_new_records(worksheet, batch, existing_dots)
+                if delivered_store:
+                    delivered_store.mark_delivered((record.dot_number for record in batch), target_date)
+                new_writer.write(new_records)
+                new_count += len(new_records)
+        
+            # Keep the original contract: no "_new" file when nothing is new
+            if not new_count:
+                new_writer.discard()
+                logger.info("No new records to save - all records already exist")
+        
+        sheet_url = sink.finalize_daily_tab(worksheet)
+    finally:
+        sink.close()
+    
+    csv_path_all = all_writer.filepath
+    csv_path_new = new_writer.filepath if new_count else None
+    
+    logger.info(f"Comparison results: {new_count} new, {existing_count} existing, {total_count} total")
+    
+    # Step 5: Send email notification with only new records
+    logger.info("Step 5: Sending email notification...")
+    email_handler = EmailHandler()
+    email_handler.send_daily_report(
+        date=target_date,
+        new_record_count=new_count,
+        total_record_count=total_count,
+        existing_count=existing_count,
+        sheet_url=sheet_url,
+        csv_path=csv_path_new
+    )
+    
+    log_summary(target_date, total_count, new_count, existing_count, sheet_url, csv_path_all, csv_path_new)
+
+
+def main(target_date: Optional[str] = None, stream: bool = STREAM_PAGES,
+         start_date: Optional[str] = None, end_date: Optional[str] = None,
+         use_cache: Optional[bool] = None, sync: bool = False, rebuild_index: bool = False,
+         seed_delivered: bool = False):
     """
     Main function to fetch, process, and deliver DOT leads
     
     Args:
         target_date: Optional date in YYYY-MM-DD format. If None, uses yesterday's date.
+        stream: If True, process and deliver records page by page (see run_streaming)
+        start_date: Optional first date of a backfill range (requires end_date)
+        end_date: Optional last date of a backfill range (requires start_date)
+        use_cache: Whether to use the Socrata response cache. If None, uses
+                   SOCRATA_CACHE_ENABLED from config.
+        sync: If True, run an incremental :updated_at sync instead of a date pull
+        rebuild_index: If True, rebuild the local DOT index from the sheet and exit
+        seed_delivered: If True, seed the delivered-DOT store from the CSV backups and exit
     """
     dot_fetcher = None
+    delivered_store = None
+    sink = None
     try:
+        if rebuild_index:
+            # Imported here so offline sinks do not need the Google libraries
+            from google_sheets_handler import GoogleSheetsHandler
+            logger.info("Rebuilding local DOT index from Google Sheet")
+            sink = GoogleSheetsHandler()
+            sink.rebuild_dot_index()
+            return
+        
+        if seed_delivered:
+            delivered_store = open_delivered_store()
+            if not delivered_store:
+                raise ValueError("GLOBAL_DEDUPE_ENABLED is false; there is no delivered-DOT store to seed")
+            logger.info("Seeding delivered-DOT store from CSV backups")
+            # Oldest first, so each DOT number keeps the date it was first delivered
+            for backup_date, dot_numbers in CSVHandler().iter_backup_dot_numbers():
+                delivered_store.mark_delivered(dot_numbers, backup_date)
+            logger.info(f"Delivered-DOT store now holds {delivered_store.count} DOT numbers")
+            return
+        
+        # Incremental sync: only rows changed since the stored watermark
+        if sync:
+            logger.info("Starting DOT Leads incremental sync")
+            dot_fetcher = DOTFetcher(use_cache=use_cache)
+            run_sync(dot_fetcher, SyncState(SYNC_STATE_PATH))
+            return
+        
+        # Range mode: one query for the whole backfill, delivered per day
+        if start_date or end_date:
+            if not (start_date and end_date):
+                raise ValueError("Both start_date and end_date are required for a date range")
+            if datetime.strptime(start_date, DATE_FORMAT) > datetime.strptime(end_date, DATE_FORMAT):
+                raise ValueError(f"start_date {start_date} is after end_date {end_date}")
+            
+            logger.info(f"Starting DOT Leads Automation for date range: {start_date} to {end_date}")
+            dot_fetcher = DOTFetcher(use_cache=use_cache)
+            delivered_store = open_delivered_store()
+            run_range(dot_fetcher, start_date, end_date, delivered_store)
+            return
+        
         # Determine target date
         if target_date is None:
             target_date = (datetime.now() - timedelta(days=1)).strftime(DATE_FORMAT)
         
         logger.info(f"Starting DOT Leads Automation for date: {target_date}")
         
+        dot_fetcher = DOTFetcher(use_cache=use_cache)
+        delivered_store = open_delivered_store()
+        if stream:
+            run_streaming(dot_fetcher, target_date, delivered_store)
+            return
+        
+        if CHECKPOINT_RUNS:
+            manifest = RunManifest(target_date, RUN_MANIFEST_DIR)
+            processed_records = fetch_with_checkpoints(dot_fetcher, target_date, manifest)
+            
+            if not processed_records:
+                logger.info(f"No new DOT records found for {target_date}")
+                # Nothing to resume; the day may simply not be published yet
+                manifest.reset()
+                return
+            
+            logger.info(f"Processed {len(processed_records)} unique records")
+            
+            sink = None if manifest.is_done("sheets") else create_sink()
+            deliver_records(target_date, processed_records, sink, CSVHandler(), EmailHandler(), manifest,
+                            delivered_store)
+            return
+        
         # Step 1: Fetch new DOT records
         logger.info("Step 1: Fetching DOT records from Socrata API...")
-        dot_fetcher = DOTFetcher()
         raw_records = dot_fetcher.fetch_new_dots(target_date)
         
         if not raw_records:
@@ -52,48 +489,9 @@ def main(target_date: Optional[str] = None):
             logger.info("No records after processing")
             return
         
-        # Step 3: Upload to Google Sheets and get only new records
-        logger.info("Step 3: Checking Google Sheet for existing records...")
-        sheets_handler = GoogleSheetsHandler()
-        sheet_url, new_records, existing_count = sheets_handler.create_daily_tab(target_date, processed_records)
-        
-        logger.info(f"Comparison results: {len(new_records)} new, {existing_count} existing, {len(processed_records)} total")
-        
-        # Step 4: Save CSV files
-        logger.info("Step 4: Saving records to CSV...")
-        csv_handler = CSVHandler()
-        
-        # Save all records (backup)
-        csv_path_all = csv_handler.save_records(processed_records, target_date, "_all")
-        
-        # Save only new records (for email attachment)
-        csv_path_new = None
-        if new_records:
-            csv_path_new = csv_handler.save_records(new_records, target_date, "_new")
-            logger.info(f"Saved {len(new_records)} new records to CSV: {csv_path_new}")
-        else:
-            logger.info("No new records to save - all records already exist")
-        
-        # Step 5: Send email notification with only new records
-        logger.info("Step 5: Sending email notification...")
-        email_handler = EmailHandler()
-        email_handler.send_daily_report(
-            date=target_date,
-            new_record_count=len(new_records),
-            total_record_count=len(processed_records),
-            existing_count=existing_count,
-            sheet_url=sheet_url,
-            csv_path=csv_path_new  # Only attach CSV with new records
-        )
-        
-        logger.info(f"Successfully completed DOT Leads Automation for {target_date}")
-        logger.info(f"Total records found: {len(processed_records)}")
-        logger.info(f"New records added: {len(new_records)}")
-        logger.info(f"Existing records: {existing_count}")
-        logger.info(f"Google Sheet: {sheet_url}")
-        if csv_path_new:
-            logger.info(f"New records CSV: {csv_path_new}")
-        logger.info(f"All records CSV: {csv_path_all}")
+        sink = create_sink()
+        deliver_records(target_date, processed_records, sink, CSVHandler(), EmailHandler(),
+                        delivered_store=delivered_store)
         
     except Exception as e:
         error_msg = f"Error in DOT Leads Automation: {str(e)}"
@@ -111,6 +509,11 @@ def main(target_date: Optional[str] = None):
     finally:
         if dot_fetcher:
             dot_fetcher.close()
+        if delivered_store:
+            delivered_store.close()
+        if sink:
+            sink.close()
+        close_smtp_connections()
 
 
 if __name__ == "__main__":
@@ -123,6 +526,57 @@ if __name__ == "__main__":
         help="Target date in YYYY-MM-DD format (default: yesterday)",
         default=None
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Process and deliver records page by page to bound memory (overrides STREAM_PAGES from .env)"
+    )
+    
+    parser.add_argument(
+        "--start-date",
+        type=str,
+        help="First date of a backfill range in YYYY-MM-DD format (use with --end-date)",
+        default=None
+    )
+    parser.add_argument(
+        "--end-date",
+        type=str,
+        help="Last date of a backfill range in YYYY-MM-DD format (use with --start-date)",
+        default=None
+    )
+    
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Bypass the local Socrata response cache and always query the API"
+    )
+    
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Pull only records changed since the last successful sync (:updated_at watermark) and upsert them"
+    )
+    
+    parser.add_argument(
+        "--rebuild-index",
+        action="store_true",
+        help="Rebuild the local DOT index from the Google Sheet tabs and exit"
+    )
+    
+    parser.add_argument(
+        "--seed-delivered",
+        action="store_true",
+        help="Seed the global delivered-DOT store from the _all CSV backups and exit"
+    )
     
     args = parser.parse_args()
-    main(target_date=args.date)
+    main(
+        target_date=args.date,
+        stream=args.stream or STREAM_PAGES,
+        start_date=args.start_date,
+        end_date=args.end_date,
+        use_cache=False if args.no_cache else None,
+        sync=args.sync,
+        rebuild_index=args.rebuild_index,
+        seed_delivered=args.seed_delivered
+    )
@@ -0,0 +1,295 @@
+"""
+Pluggable output sinks for processed DOT leads
+
+Every sink exposes the daily-tab interface of GoogleSheetsHandler, so the
+pipeline in main.py can deliver to Google Sheets, a local SQLite database,
+local files, or several of them side by side:
+
+    create_daily_tab(date, records)  -> (url, new_records, existing_count)
+    has_daily_tab(date)              -> bool (never creates anything)
+    upsert_records(date, records)    -> (url, new_records, updated_count)
+    open_daily_tab(date)             -> (tab, existing_dots, existing_count)
+    append_new_records(tab, records, existing_dots) -> new_records
+    finalize_daily_tab(tab)          -> url
+    close()                          -> None
+"""
+import csv
+import logging
+import os
+import sqlite3
+from typing import List, Set
+from config import OUTPUT_SINKS, SQLITE_SINK_PATH, LOCAL_SINK_DIR
+from data_processor import DataProcessor, DOTRecord
+from utils import ensure_output_directory
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteSink:
+    """Stores each day's leads in a local SQLite table, one "tab" per add date"""
+
+    def __init__(self, path: str = SQLITE_SINK_PATH):
+        """
+        Open (or create) the database
+
+        Args:
+            path: Path of the SQLite database file
+        """
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript("""
+            PRAGMA journal_mode=WAL;
+            PRAGMA synchronous=NORMAL;
+            CREATE TABLE IF NOT EXISTS leads (
+                tab TEXT NOT NULL,
+                dot_number TEXT NOT NULL,
+                legal_name TEXT,
+                dba_name TEXT,
+                phy_city TEXT,
+                phy_state TEXT,
+                phy_zip TEXT,
+                telephone TEXT,
+                add_date TEXT,
+                date_pulled TEXT,
+                PRIMARY KEY (tab, dot_number)
+            ) WITHOUT ROWID;
+        """)
+
+    def get_url(self, date: str) -> str:
+        """Get a URL identifying the day's rows"""
+        return f"sqlite:///{os.path.abspath(self.path)}?tab={date}"
+
+    def has_daily_tab(self, date: str) -> bool:
+        """Check whether any rows are stored for a date"""
+        return self.conn.execute("SELECT 1 FROM leads WHERE tab = ? LIMIT 1", (date,)).fetchone() is not None
+
+    def get_existing_dot_numbers(self, date: str) -> Set[str]:
+        """Get the DOT numbers already stored for a date"""
+        rows = self.conn.execute("SELECT dot_number FROM leads WHERE tab = ?", (date,))
+        return {dot_number for (dot_number,) in rows}
+
+    def _insert(self, date: str, records: List[DOTRecord], replace: bool = False) -> None:
+        verb = "INSERT OR REPLACE" if replace else "INSERT OR IGNORE"
+        with self.conn:
+            self.conn.executemany(
+                f"{verb} INTO leads VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                ((date, *record) for record in records)
+            )
+
+    def create_daily_tab(self, date: str, records: List[DOTRecord]) -> tuple:
+        """Store the records not yet stored for the date"""
+        existing_dots = self.get_existing_dot_numbers(date)
+        existing_count = len(existing_dots)
+        new_records = DataProcessor.filter_new_records(records, existing_dots)
+        self._insert(date, new_records)
+        logger.info(f"SQLite sink: {len(new_records)} new records for {date} ({existing_count} existing)")
+        return self.get_url(date), new_records, existing_count
+
+    def upsert_records(self, date: str, records: List[DOTRecord]) -> tuple:
+        """Replace stored rows of the date by DOT number and add the rest"""
+        existing_dots = self.get_existing_dot_numbers(date)
+        new_records = [record for record in records if record.dot_number not in existing_dots]
+        self._insert(date, records, replace=True)
+        return self.get_url(date), new_records, len(records) - len(new_records)
+
+    def open_daily_tab(self, date: str) -> tuple:
+        """Open the date for incremental appends"""
+        existing_dots = self.get_existing_dot_numbers(date)
+        return date, existing_dots, len(existing_dots)
+
+    def append_new_records(self, date: str, records: List[DOTRecord], existing_dots: Set[str]) -> List[DOTRecord]:
+        """Append the records of one batch that are not stored yet"""
+        new_records = DataProcessor.filter_new_records(records, existing_dots)
+        self._insert(date, new_records)
+        return new_records
+
+    def finalize_daily_tab(self, date: str) -> str:
+        """Nothing to finalize; return the URL"""
+        return self.get_url(date)
+
+    def close(self) -> None:
+        """Close the database connection"""
+        self.conn.close()
+
+
+class LocalFileSink:
+    """Stores each day's leads in a local CSV file standing in for the day's Sheets tab"""
+
+    def __init__(self, output_dir: str = LOCAL_SINK_DIR):
+        """
+        Initialize the sink
+
+        Args:
+            output_dir: Directory holding one CSV file per add date
+        """
+        self.output_dir = output_dir
+        ensure_output_directory(output_dir)
+
+    def get_filepath(self, date: str) -> str:
+        """Build the file path of a date's "tab" """
+        return os.path.join(self.output_dir, f"dot_leads_{date}.csv")
+
+    def get_url(self, date: str) -> str:
+        """Get a file URL for the date's "tab" """
+        return f"file://{os.path.abspath(self.get_filepath(date))}"
+
+    def has_daily_tab(self, date: str) -> bool:
+        """Check whether the date's file exists"""
+        return os.path.exists(self.get_filepath(date))
+
+    def get_existing_dot_numbers(self, date: str) -> Set[str]:
+        """Read the DOT Number column of the date's file"""
+        filepath = self.get_filepath(date)
+        if not os.path.exists(filepath):
+            return set()
+        with open(filepath, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            return {row[0] for row in reader if row and row[0]}
+
+    def _append(self, date: str, records: List[DOTRecord]) -> None:
+        filepath = self.get_filepath(date)
+        write_header = not os.path.exists(filepath)
+        with open(filepath, 'a', newline='', encoding='utf-8') as f:
+            writer = csv.writer(f)
+            if write_header:
+                writer.writerow(DataProcessor.get_column_headers())
+            writer.writerows(records)
+
+    def create_daily_tab(self, date: str, records: List[DOTRecord]) -> tuple:
+        """Append the records not yet in the date's file"""
+        existing_dots = self.get_existing_dot_numbers(date)
+        existing_count = len(existing_dots)
+        new_records = DataProcessor.filter_new_records(records, existing_dots)
+        self._append(date, new_records)
+        logger.info(f"Local file sink: {len(new_records)} new records for {date} ({existing_count} existing)")
+        return self.get_url(date), new_records, existing_count
+
+    def upsert_records(self, date: str, records: List[DOTRecord]) -> tuple:
+        """Replace rows of the date's file by DOT number and append the rest (atomic rewrite)"""
+        filepath = self.get_filepath(date)
+        existing_dots = self.get_existing_dot_numbers(date)
+        new_records = [record for record in records if record.dot_number not in existing_dots]
+        if not existing_dots:
+            self._append(date, records)
+            return self.get_url(date), new_records, 0
+
+        updates = {record.dot_number: record for record in records}
+        tmp_path = f"{filepath}.tmp"
+        with open(filepath, 'r', newline='', encoding='utf-8') as src, \
+                open(tmp_path, 'w', newline='', encoding='utf-8') as dst:
+            reader = csv.reader(src)
+            writer = csv.writer(dst)
+            writer.writerow(next(reader, DataProcessor.get_column_headers()))
+            for row in reader:
+                writer.writerow(updates.pop(row[0] if row else "", row))
+            writer.writerows(updates.values())
+        os.replace(tmp_path, filepath)
+        return self.get_url(date), new_records, len(records) - len(new_records)
+
+    def open_daily_tab(self, date: str) -> tuple:
+        """Open the date's file for incremental appends"""
+        existing_dots = self.get_existing_dot_numbers(date)
+        if not os.path.exists(self.get_filepath(date)):
+            self._append(date, [])
+        return date, existing_dots, len(existing_dots)
+
+    def append_new_records(self, date: str, records: List[DOTRecord], existing_dots: Set[str]) -> List[DOTRecord]:
+        """Append the records of one batch that are not in the file yet"""
+        new_records = DataProcessor.filter_new_records(records, existing_dots)
+        self._append(date, new_records)
+        return new_records
+
+    def finalize_daily_tab(self, date: str) -> str:
+        """Nothing to finalize; return the URL"""
+        return self.get_url(date)
+
+    def close(self) -> None:
+        """Nothing to close; every write opens and closes its file"""
+
+
+class MultiSink:
+    """
+    Fans every write out to several sinks
+
+    The first sink is the primary one: its URL, new records and counts are
+    what the pipeline reports and emails. The others receive the same
+    records and track their own existing DOT numbers.
+    """
+
+    def __init__(self, sinks: List):
+        """
+        Initialize the fan-out
+
+        Args:
+            sinks: Sinks in priority order (first is primary)
+        """
+        self.sinks = sinks
+
+    def create_daily_tab(self, date: str, records: List[DOTRecord]) -> tuple:
+        """Deliver to every sink; returns the primary sink's result"""
+        results = [sink.create_daily_tab(date, records) for sink in self.sinks]
+        return results[0]
+
+    def has_daily_tab(self, date: str) -> bool:
+        """Check the primary sink for the date"""
+        return self.sinks[0].has_daily_tab(date)
+
+    def upsert_records(self, date: str, records: List[DOTRecord]) -> tuple:
+        """Upsert into every sink; returns the primary sink's result"""
+        results = [sink.upsert_records(date, records) for sink in self.sinks]
+        return results[0]
+
+    def open_daily_tab(self, date: str) -> tuple:
+        """Open the date in every sink; the tab handle carries each sink's own state"""
+        # The primary sink's existing set is the one the caller holds; the
+        # others keep theirs inside the returned tab handle
+        tabs = [sink.open_daily_tab(date) for sink in self.sinks]
+        _, primary_dots, primary_count = tabs[0]
+        return tabs, primary_dots, primary_count
+
+    def append_new_records(self, tabs: List[tuple], records: List[DOTRecord],
+                           existing_dots: Set[str]) -> List[DOTRecord]:
+        """Append a batch to every sink; returns the records new to the primary sink"""
+        new_records = self.sinks[0].append_new_records(tabs[0][0], records, existing_dots)
+        for sink, (tab, sink_dots, _) in zip(self.sinks[1:], tabs[1:]):
+            sink.append_new_records(tab, records, sink_dots)
+        return new_records
+
+    def finalize_daily_tab(self, tabs: List[tuple]) -> str:
+        """Finalize every sink; returns the primary sink's URL"""
+        urls = [sink.finalize_daily_tab(tab) for sink, (tab, _, _) in zip(self.sinks, tabs)]
+        return urls[0]
+
+    def close(self) -> None:
+        """Close every sink"""
+        for sink in self.sinks:
+            sink.close()
+
+
+def create_sink():
+    """
+    Build the output sink(s) configured in OUTPUT_SINKS
+
+    Returns:
+        A single sink, or a MultiSink when several are configured
+    """
+    sinks = []
+    for name in OUTPUT_SINKS:
+        if name == "google_sheets":
+            # Imported lazily so offline sinks do not need the Google libraries
+            from google_sheets_handler import GoogleSheetsHandler
+            sinks.append(GoogleSheetsHandler())
+        elif name == "sqlite":
+            sinks.append(SQLiteSink())
+        elif name == "local_file":
+            sinks.append(LocalFileSink())
+        else:
+            raise ValueError(f"Unknown output sink '{name}' (expected google_sheets, sqlite or local_file)")
+
+    logger.info(f"Output sinks: {', '.join(OUTPUT_SINKS)}")
+    return sinks[0] if len(sinks) == 1 else MultiSink(sinks)
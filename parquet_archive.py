@@ -0,0 +1,223 @@
+"""
+Columnar Parquet archive of every pull, partitioned by add_date
+
+Each run writes its records under ``{root}/add_date={date}/{name}.parquet``
+(hive partitioning), so historical questions such as "has DOT X been seen,
+and when" are answered by a filtered columnar scan instead of parsing every
+daily CSV:
+
+    python parquet_archive.py 1234567 2345678
+"""
+import logging
+import os
+import sys
+from typing import Dict, Iterable, Optional, Set
+from config import PARQUET_ARCHIVE_ENABLED, PARQUET_ARCHIVE_DIR
+from data_processor import DOTRecord
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is optional; the archive is disabled without it
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+# add_date lives in the partition directory name, not in the files
+FILE_FIELDS = [field for field in DOTRecord._fields if field != "add_date"]
+FILE_FIELD_INDEXES = [DOTRecord._fields.index(field) for field in FILE_FIELDS]
+
+# Partition for records whose ADD_DATE could not be parsed
+UNKNOWN_PARTITION = "unknown"
+
+# Rows buffered per partition before a row group is written
+ROW_GROUP_ROWS = 65536
+
+
+class ParquetArchiveWriter:
+    """Streams records into one Parquet file per add_date partition"""
+
+    def __init__(self, root: str, name: str):
+        """
+        Initialize the writer (files are opened lazily per partition)
+
+        Files are written under a dot-prefixed temporary name, which dataset
+        scans ignore, and renamed into place when the writer is closed.
+
+        Args:
+            root: Archive root directory
+            name: File name (without extension) used in every partition
+        """
+        self.root = root
+        self.name = name
+        self.count = 0
+        self.schema = pa.schema([(field, pa.string()) for field in FILE_FIELDS])
+        self._buffers = {}
+        self._files = {}
+
+    def _paths(self, add_date: str) -> tuple:
+        directory = os.path.join(self.root, f"add_date={add_date}")
+        return os.path.join(directory, f".{self.name}.parquet.tmp"), os.path.join(directory, f"{self.name}.parquet")
+
+    def _flush(self, add_date: str) -> None:
+        """Write the buffered records of a partition as one row group, sorted by DOT number"""
+        records = self._buffers.pop(add_date, None)
+        if not records:
+            return
+        if add_date not in self._files:
+            tmp_path, _ = self._paths(add_date)
+            os.makedirs(os.path.dirname(tmp_path), exist_ok=True)
+            # Sorted row groups give tight min/max statistics for predicate pushdown
+            self._files[add_date] = pq.ParquetWriter(tmp_path, self.schema, compression="zstd")
+
+        columns = list(zip(*records))
+        table = pa.Table.from_arrays(
+            [pa.array(columns[index], pa.string()) for index in FILE_FIELD_INDEXES], schema=self.schema
+        )
+        self._files[add_date].write_table(table.sort_by("dot_number"))
+
+    def write_record(self, record: DOTRecord) -> None:
+        """Append one processed record"""
+        add_date = record.add_date or UNKNOWN_PARTITION
+        buffer = self._buffers.setdefault(add_date, [])
+        buffer.append(record)
+        self.count += 1
+        if len(buffer) >= ROW_GROUP_ROWS:
+            self._flush(add_date)
+
+    def write(self, records: Iterable[DOTRecord]) -> None:
+        """Append a batch of processed records"""
+        for record in records:
+            self.write_record(record)
+
+    def close(self) -> None:
+        """Flush all partitions and move their files into place"""
+        for add_date in list(self._buffers):
+            self._flush(add_date)
+        for add_date, writer in self._files.items():
+            writer.close()
+            tmp_path, path = self._paths(add_date)
+            os.replace(tmp_path, path)
+        self._files = {}
+
+    def discard(self) -> None:
+        """Close and delete the partially written files"""
+        self._buffers = {}
+        for add_date, writer in self._files.items():
+            writer.close()
+            os.remove(self._paths(add_date)[0])
+        self._files = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type:
+            self.discard()
+        else:
+            self.close()
+        return False
+
+
+class ParquetArchive:
+    """Read/write access to the add_date-partitioned Parquet archive"""
+
+    def __init__(self, root: str = PARQUET_ARCHIVE_DIR):
+        """
+        Initialize the archive
+
+        Args:
+            root: Archive root directory
+        """
+        self.root = root
+
+    def open_writer(self, name: str) -> ParquetArchiveWriter:
+        """
+        Open a writer for one pull
+
+        Args:
+            name: File name (without extension), e.g. "dot_leads_2024-01-15"
+
+        Returns:
+            ParquetArchiveWriter
+        """
+        return ParquetArchiveWriter(self.root, name)
+
+    def _dataset(self):
+        partitioning = ds.partitioning(pa.schema([("add_date", pa.string())]), flavor="hive")
+        return ds.dataset(self.root, format="parquet", partitioning=partitioning)
+
+    def first_seen(self, dot_numbers: Iterable[str]) -> Dict[str, str]:
+        """
+        Look up the earliest add_date each DOT number was archived under
+
+        Only the DOT Number column is read, and row groups whose statistics
+        rule out every requested DOT number are skipped.
+
+        Args:
+            dot_numbers: DOT numbers to look up
+
+        Returns:
+            Dict of DOT number to earliest add_date, for archived DOT numbers only
+        """
+        dot_numbers = list(dot_numbers)
+        if not dot_numbers or not os.path.isdir(self.root):
+            return {}
+
+        table = self._dataset().to_table(
+            columns=["dot_number", "add_date"],
+            filter=ds.field("dot_number").isin(dot_numbers)
+        )
+        grouped = table.group_by("dot_number").aggregate([("add_date", "min")])
+        return dict(zip(grouped["dot_number"].to_pylist(), grouped["add_date_min"].to_pylist()))
+
+    def dot_numbers(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Set[str]:
+        """
+        Collect every archived DOT number, optionally for an add_date range
+
+        The date range prunes whole partitions, so only matching directories are read.
+
+        Args:
+            start_date: Optional first add_date (YYYY-MM-DD), inclusive
+            end_date: Optional last add_date (YYYY-MM-DD), inclusive
+
+        Returns:
+            Set of DOT numbers
+        """
+        if not os.path.isdir(self.root):
+            return set()
+
+        condition = None
+        if start_date:
+            condition = ds.field("add_date") >= start_date
+        if end_date:
+            before_end = ds.field("add_date") <= end_date
+            condition = before_end if condition is None else condition & before_end
+
+        table = self._dataset().to_table(columns=["dot_number"], filter=condition)
+        return set(table["dot_number"].unique().to_pylist())
+
+
+def open_archive() -> Optional[ParquetArchive]:
+    """Return the Parquet archive, or None if it is disabled or pyarrow is not installed"""
+    if not PARQUET_ARCHIVE_ENABLED:
+        return None
+    if pa is None:
+        logger.warning("PARQUET_ARCHIVE_ENABLED=true but pyarrow is not installed; skipping the Parquet archive")
+        return None
+    return ParquetArchive()
+
+
+if __name__ == "__main__":
+    if pa is None:
+        sys.exit("pyarrow is required: pip install pyarrow")
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python parquet_archive.py DOT_NUMBER [DOT_NUMBER ...]")
+
+    seen = ParquetArchive().first_seen(sys.argv[1:])
+    for dot_number in sys.argv[1:]:
+        if dot_number in seen:
+            print(f"DOT {dot_number}: first seen {seen[dot_number]}")
+        else:
+            print(f"DOT {dot_number}: not seen")
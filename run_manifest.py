@@ -0,0 +1,130 @@
+"""
+Per-date run manifest used to checkpoint and resume main.py runs
+"""
+import gzip
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+from data_processor import DOTRecord
+from utils import ensure_output_directory
+
+logger = logging.getLogger(__name__)
+
+# Pipeline stages in execution order
+STAGES = ["fetched", "sheets", "csv", "email"]
+
+
+class RunManifest:
+    """Records which stages of a date's run have completed and where their artifacts live"""
+
+    def __init__(self, date: str, manifest_dir: str):
+        """
+        Load the manifest for a date, starting a new one if none exists
+
+        A manifest left by a run that finished every stage is discarded, so
+        only interrupted runs are resumed.
+
+        Args:
+            date: Date string in YYYY-MM-DD format
+            manifest_dir: Directory holding manifests and page artifacts
+        """
+        self.date = date
+        self.manifest_dir = manifest_dir
+        self.path = os.path.join(manifest_dir, f"run_{date}.json")
+        ensure_output_directory(manifest_dir)
+
+        self.data = {"date": date, "stages": {}}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read run manifest {self.path}: {str(e)}. Starting fresh.")
+
+        if self.data.get("completed"):
+            self.reset()
+        elif self.data["stages"]:
+            done = [stage for stage in STAGES if self.is_done(stage)]
+            logger.info(f"Resuming run for {date}; completed stages: {', '.join(done) or 'none'}")
+
+    def is_done(self, stage: str) -> bool:
+        """Return True if the stage has completed"""
+        return bool(self.data["stages"].get(stage, {}).get("done"))
+
+    def get(self, stage: str) -> Dict:
+        """Return the recorded data of a stage (empty if not started)"""
+        return self.data["stages"].get(stage, {})
+
+    def complete(self, stage: str, **data) -> None:
+        """
+        Mark a stage as completed and persist the manifest
+
+        Args:
+            stage: Stage name (see STAGES)
+            **data: JSON-serializable details to record for the stage
+        """
+        entry = self.data["stages"].setdefault(stage, {})
+        entry.update(data)
+        entry["done"] = True
+        entry["completed_at"] = datetime.now().isoformat(timespec="seconds")
+        if all(self.is_done(name) for name in STAGES):
+            self.data["completed"] = True
+        self.save()
+
+    def record_page(self, records: List[DOTRecord], last_dot_number: Optional[str]) -> None:
+        """
+        Persist one page of processed records and advance the fetch checkpoint
+
+        Each page is written to its own gzip file (atomically) so a crash can
+        never leave a half-written artifact behind.
+
+        Args:
+            records: Processed records of the page
+            last_dot_number: Highest dot_number fetched so far (keyset resume point)
+        """
+        fetched = self.data["stages"].setdefault("fetched", {"pages": [], "record_count": 0})
+        page_path = os.path.join(self.manifest_dir, f"run_{self.date}_page{len(fetched['pages']):05d}.jsonl.gz")
+
+        tmp_path = f"{page_path}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record))
+                f.write("\n")
+        os.replace(tmp_path, page_path)
+
+        fetched["pages"].append(page_path)
+        fetched["record_count"] += len(records)
+        fetched["last_dot_number"] = last_dot_number
+        self.save()
+
+    def load_processed(self) -> List[DOTRecord]:
+        """Load the processed records written by record_page"""
+        records = []
+        for page_path in self.get("fetched").get("pages", []):
+            with gzip.open(page_path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    records.append(DOTRecord(*json.loads(line)))
+        return records
+
+    def save(self) -> None:
+        """Atomically write the manifest to disk"""
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def cleanup(self) -> None:
+        """Delete page artifacts once the run has completed"""
+        for page_path in self.get("fetched").get("pages", []):
+            try:
+                os.remove(page_path)
+            except FileNotFoundError:
+                pass
+
+    def reset(self) -> None:
+        """Discard the manifest and its artifacts and start a new run"""
+        self.cleanup()
+        self.data = {"date": self.date, "stages": {}}
+        self.save()
@@ -9,7 +9,9 @@ import subprocess
 import sys
 import os
 from datetime import datetime, timedelta
-from config import DATE_FORMAT, MODE, TEST_INTERVAL_SECONDS, PRODUCTION_CRON_HOUR, PRODUCTION_CRON_MINUTE
+from config import (
+    DATE_FORMAT, MODE, TEST_INTERVAL_SECONDS, PRODUCTION_CRON_HOUR, PRODUCTION_CRON_MINUTE, SCHEDULER_IN_PROCESS
+)
 
 # Configure logging
 logging.basicConfig(
@@ -29,6 +31,9 @@ def run_automation(target_date=None):
     try:
         logger.info(f"Starting automation for date: {target_date or 'yesterday'}")
         
+        if SCHEDULER_IN_PROCESS:
+            return run_automation_in_process(target_date)
+        
         # Build command
         cmd = [sys.executable, 'main.py']
         if target_date:
@@ -53,6 +58,27 @@ def run_automation(target_date=None):
         return False
 
 
+def run_automation_in_process(target_date=None):
+    """
+    Run the automation inside the scheduler process
+    
+    Keeps process-level state such as the authorized Google Sheets client
+    and spreadsheet metadata warm between runs.
+    """
+    from main import main
+    
+    try:
+        main(target_date=target_date)
+    except SystemExit as e:
+        # main() exits non-zero after logging and reporting a failed run
+        if e.code:
+            logger.error(f"Automation failed with exit code: {e.code}")
+            return False
+    
+    logger.info("Automation completed successfully")
+    return True
+
+
 def calculate_next_run_time(test_mode=False, test_interval_seconds=None):
     """
     Calculate the next run time
@@ -0,0 +1,95 @@
+"""
+Chunked, rate-limited writes to Google Sheets
+"""
+import logging
+from typing import Callable, List, Optional, Sequence
+import gspread
+from config import (
+    SHEETS_WRITE_CHUNK_ROWS, SHEETS_WRITE_REQUESTS_PER_MINUTE, SHEETS_MAX_RETRIES,
+    SHEETS_BACKOFF_BASE_SECONDS, SHEETS_BACKOFF_MAX_SECONDS
+)
+from utils import TokenBucket, call_with_retry
+
+logger = logging.getLogger(__name__)
+
+
+class SheetsBatchWriter:
+    """Splits large writes into chunks sent under a request-rate budget, retrying throttled chunks"""
+
+    def __init__(self, chunk_rows: int = SHEETS_WRITE_CHUNK_ROWS,
+                 requests_per_minute: float = SHEETS_WRITE_REQUESTS_PER_MINUTE,
+                 max_retries: int = SHEETS_MAX_RETRIES):
+        """
+        Initialize the writer
+
+        Args:
+            chunk_rows: Maximum rows sent per request
+            requests_per_minute: Write requests allowed per minute (Sheets quota is per minute)
+            max_retries: Retries per request before giving up
+        """
+        self.chunk_rows = chunk_rows
+        self.max_retries = max_retries
+        self.rate_limiter = TokenBucket(requests_per_minute / 60.0)
+
+    def execute(self, request: Callable, *args, **kwargs):
+        """
+        Run one Sheets request under the rate limit, retrying quota and transient errors
+
+        Waits at least as long as any Retry-After header asks, otherwise uses
+        jittered exponential backoff.
+
+        Args:
+            request: Bound gspread method (e.g. worksheet.update)
+            *args, **kwargs: Arguments for the request
+
+        Returns:
+            Whatever the request returns
+        """
+        return call_with_retry(
+            lambda: request(*args, **kwargs),
+            gspread.exceptions.APIError, self.max_retries,
+            SHEETS_BACKOFF_BASE_SECONDS, SHEETS_BACKOFF_MAX_SECONDS,
+            rate_limiter=self.rate_limiter, description="Sheets request"
+        )
+
+    def write_rows(self, worksheet, rows: Sequence, start_row: int,
+                   on_chunk: Optional[Callable[[Sequence], None]] = None) -> int:
+        """
+        Write rows in chunks, each to its own fixed range (A{row})
+
+        Unlike values.append, a fixed-range write is idempotent, so retrying a
+        chunk whose first attempt was applied despite a timeout can never
+        duplicate rows. The grid must already have enough rows. ``on_chunk``
+        is called after each acknowledged chunk, letting the caller record
+        progress so an interrupted upload resumes after the last chunk that
+        made it.
+
+        Args:
+            worksheet: Google Sheets worksheet object
+            rows: Rows to write
+            start_row: 1-based row of the first row
+            on_chunk: Optional callback receiving each written chunk
+
+        Returns:
+            Number of rows written
+        """
+        chunk_count = (len(rows) + self.chunk_rows - 1) // self.chunk_rows
+        for index, start in enumerate(range(0, len(rows), self.chunk_rows), start=1):
+            chunk = rows[start:start + self.chunk_rows]
+            self.execute(worksheet.update, range_name=f"A{start_row + start}", values=chunk)
+            if on_chunk:
+                on_chunk(chunk)
+            if chunk_count > 1:
+                logger.info(f"Wrote chunk {index}/{chunk_count} ({len(chunk)} rows) to '{worksheet.title}'")
+        return len(rows)
+
+    def write_updates(self, worksheet, updates: List[dict]) -> None:
+        """
+        Send range updates ({'range', 'values'}) in batches of at most chunk_rows ranges
+
+        Args:
+            worksheet: Google Sheets worksheet object
+            updates: Range updates as accepted by worksheet.batch_update
+        """
+        for start in range(0, len(updates), self.chunk_rows):
+            self.execute(worksheet.batch_update, updates[start:start + self.chunk_rows])
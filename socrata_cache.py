@@ -0,0 +1,138 @@
+"""
+Local on-disk cache for Socrata API responses
+"""
+import gzip
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+from utils import ensure_output_directory
+
+logger = logging.getLogger(__name__)
+
+
+class SocrataCache:
+    """Content-addressed, gzip-compressed cache of Socrata query results"""
+
+    def __init__(self, cache_dir: str, ttl_seconds: int, max_bytes: int):
+        """
+        Initialize the cache
+
+        Args:
+            cache_dir: Directory holding the cache entries
+            ttl_seconds: Age after which an entry is treated as a miss
+            max_bytes: Total size above which least recently used entries are evicted
+        """
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        ensure_output_directory(cache_dir)
+
+    @staticmethod
+    def make_key(dataset_id: str, params: Dict) -> str:
+        """
+        Build the cache key for a query
+
+        Args:
+            dataset_id: Socrata dataset identifier
+            params: Query parameters (where, select, order, offset, limit, ...)
+
+        Returns:
+            Hex digest identifying the query
+        """
+        payload = json.dumps({"dataset": dataset_id, "params": params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.json.gz")
+
+    def get(self, key: str) -> Optional[List[Dict]]:
+        """
+        Return the cached records for a key, or None on a miss or expired entry
+
+        Args:
+            key: Cache key from make_key
+
+        Returns:
+            Cached records or None
+        """
+        path = self._path(key)
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                entry = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Discarding unreadable cache entry {path}: {str(e)}")
+            self._remove(path)
+            return None
+
+        if time.time() - entry.get("created", 0) > self.ttl_seconds:
+            self._remove(path)
+            return None
+
+        # Touch the entry so LRU eviction keeps recently used pages
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry.get("records")
+
+    def put(self, key: str, records: List[Dict]) -> None:
+        """
+        Store records for a key, then evict old entries over the size cap
+
+        Args:
+            key: Cache key from make_key
+            records: Records returned by the API
+        """
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+                json.dump({"created": time.time(), "records": records}, f)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not write cache entry {path}: {str(e)}")
+            self._remove(tmp_path)
+            return
+
+        self.evict()
+
+    def evict(self) -> None:
+        """Delete least recently used entries until the cache fits max_bytes"""
+        with self._lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.cache_dir):
+                if not name.endswith(".json.gz"):
+                    continue
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+                total += stat.st_size
+
+            if total <= self.max_bytes:
+                return
+
+            entries.sort()
+            for _, size, path in entries:
+                if total <= self.max_bytes:
+                    break
+                self._remove(path)
+                total -= size
+            logger.info(f"Evicted Socrata cache entries down to {total} bytes")
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,68 @@
+"""
+Persisted state for incremental :updated_at synchronization
+"""
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class SyncState:
+    """Stores the :updated_at high-water mark of the last successful sync run"""
+
+    def __init__(self, path: str):
+        """
+        Load the state file if it exists
+
+        Args:
+            path: Path of the JSON state file
+        """
+        self.path = path
+        self.data = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Could not read sync state {path}: {str(e)}. Starting fresh.")
+                self.data = {}
+
+    def get_watermark(self, initial_lookback_days: int = 1) -> str:
+        """
+        Get the stored high-water mark
+
+        Args:
+            initial_lookback_days: Days to look back when no watermark is stored yet
+
+        Returns:
+            Socrata floating timestamp (e.g. 2024-01-15T00:00:00.000)
+        """
+        watermark = self.data.get("updated_at_watermark")
+        if watermark:
+            return watermark
+        start = datetime.utcnow() - timedelta(days=initial_lookback_days)
+        return start.strftime("%Y-%m-%dT%H:%M:%S.000")
+
+    def set_watermark(self, watermark: Optional[str]) -> None:
+        """
+        Persist a new high-water mark (atomically replaces the state file)
+
+        Args:
+            watermark: Highest :updated_at value processed successfully
+        """
+        if not watermark:
+            return
+        self.data["updated_at_watermark"] = watermark
+        self.data["last_success"] = datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S")
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
+        logger.info(f"Saved sync watermark: {watermark}")
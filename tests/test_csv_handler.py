@@ -0,0 +1,39 @@
+"""
+Tests for the byte-level DOT Number scan of CSV backups
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csv_handler import scan_dot_numbers  # noqa: E402
+
+HEADER = b"DOT Number,Legal Company Name,DBA Name,City,State,ZIP Code,Phone,ADD_DATE,Date Pulled\r\n"
+
+
+def write_backup(tmp_path, body: bytes) -> str:
+    path = tmp_path / "dot_leads_2024-01-15_all.csv"
+    path.write_bytes(HEADER + body)
+    return str(path)
+
+
+def test_quoted_commas_use_plain_scan(tmp_path):
+    path = write_backup(tmp_path, b'1,"ACME, INC",,Austin,TX,1,2,2024-01-15,2024-01-16\r\n'
+                                  b'2,"B ""X"", LLC",,Austin,TX,1,2,2024-01-15,2024-01-16\r\n')
+    assert scan_dot_numbers(path) == {"1", "2"}
+
+
+def test_multi_line_quoted_field_has_no_phantom_records(tmp_path):
+    path = write_backup(tmp_path, b'1,"ACME\r\n555, INC",,Austin,TX,1,2,2024-01-15,2024-01-16\r\n'
+                                  b'2,"B\n7,",,Austin,TX,1,2,2024-01-15,2024-01-16\r\n')
+    assert scan_dot_numbers(path) == {"1", "2"}
+
+
+def test_truncated_final_row_scans_in_linear_time(tmp_path):
+    # A crash mid-write leaves a final row without its \r\n terminator
+    path = write_backup(tmp_path, b'1,"ACME\r\nINC",,Austin,TX,1,2,2024-01-15,2024-01-16\r\n'
+                                  b'2,' + b'unterminated final row ' * 200)
+    start = time.monotonic()
+    assert scan_dot_numbers(path) == {"1", "2"}
+    assert time.monotonic() - start < 1
@@ -1,10 +1,19 @@
 """
 Utility functions for FMCSA DOT Leads Automation
 """
+import gc
 import logging
 import os
+import random
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict
+from functools import lru_cache
+from email.utils import parsedate_to_datetime
+from typing import Callable, List, Optional, Set
+import requests
 
 # Configure logging
 logging.basicConfig(
@@ -18,6 +27,9 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+# HTTP status codes worth retrying: throttling and transient server errors
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
 
 def ensure_output_directory(output_dir: str) -> None:
     """Ensure output directory exists"""
@@ -25,35 +37,104 @@ def ensure_output_directory(output_dir: str) -> None:
     logger.info(f"Output directory ensured: {output_dir}")
 
 
-def format_date(date_str: str, input_format: str = "%Y-%m-%dT%H:%M:%S.000") -> str:
-    """Format date string to standard format"""
+ISO_TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.000"
+
+# Values format_date could not parse since the last pop_date_parse_failures()
+_date_parse_failures = Counter()
+
+
+@lru_cache(maxsize=4096)
+def _normalize_date(date_str: str) -> Optional[str]:
+    """
+    Detect the format of a date string and normalize it to YYYY-MM-DD
+    
+    Memoized: a daily batch only contains a handful of distinct add_date values.
+    
+    Returns:
+        Normalized date, or None if the value is not a recognized date
+    """
     try:
-        dt = datetime.strptime(date_str, input_format)
-        return dt.strftime("%Y-%m-%d")
-    except (ValueError, AttributeError):
-        # Try alternative formats
-        try:
-            dt = datetime.strptime(date_str, "%Y-%m-%d")
-            return date_str
-        except (ValueError, AttributeError):
-            # Try YYYYMMDD format (used by FMCSA add_date field)
-            try:
-                if len(date_str) == 8 and date_str.isdigit():
-                    dt = datetime.strptime(date_str, "%Y%m%d")
-                    return dt.strftime("%Y-%m-%d")
-            except (ValueError, AttributeError):
-                pass
-            logger.warning(f"Could not parse date: {date_str}")
+        # YYYYMMDD (FMCSA add_date): pure string slicing, validated once per value
+        if len(date_str) == 8 and date_str.isdigit():
+            datetime(int(date_str[:4]), int(date_str[4:6]), int(date_str[6:]))
+            return f"{date_str[:4]}-{date_str[4:6]}-{date_str[6:]}"
+        
+        # Already YYYY-MM-DD
+        if len(date_str) == 10 and date_str[4] == '-' and date_str[7] == '-':
+            datetime.strptime(date_str, "%Y-%m-%d")
             return date_str
+        
+        # ISO timestamp (e.g. 2024-01-15T00:00:00.000)
+        if 'T' in date_str:
+            return datetime.strptime(date_str, ISO_TIMESTAMP_FORMAT).strftime("%Y-%m-%d")
+    except ValueError:
+        pass
+    return None
+
+
+def format_date(date_str: str, input_format: str = ISO_TIMESTAMP_FORMAT) -> str:
+    """
+    Format date string to standard format
+    
+    Unparseable values are returned unchanged and counted instead of logged
+    one by one; see pop_date_parse_failures().
+    """
+    if input_format != ISO_TIMESTAMP_FORMAT:
+        try:
+            return datetime.strptime(date_str, input_format).strftime("%Y-%m-%d")
+        except (ValueError, TypeError):
+            pass
+    
+    try:
+        normalized = _normalize_date(date_str)
+    except TypeError:
+        normalized = None
+    
+    if normalized is None:
+        _date_parse_failures[date_str] += 1
+        return date_str
+    return normalized
+
+
+def pop_date_parse_failures() -> Counter:
+    """Return and reset the counts of values format_date could not parse"""
+    failures = _date_parse_failures.copy()
+    _date_parse_failures.clear()
+    return failures
+
+
+@contextmanager
+def paused_gc():
+    """
+    Pause the cyclic garbage collector while building many small objects
+    
+    Bulk-creating millions of tuples triggers repeated full collections that
+    only rescan live data; reference counting still frees memory as usual.
+    """
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if was_enabled:
+            gc.enable()
 
 
-def deduplicate_by_dot_number(records: List[Dict]) -> List[Dict]:
-    """Remove duplicate records based on DOT number, keeping the first occurrence"""
-    seen = set()
+def deduplicate_by_dot_number(records: List, seen: Optional[Set[str]] = None) -> List:
+    """
+    Remove duplicate records based on DOT number, keeping the first occurrence
+    
+    Args:
+        records: Records to deduplicate (objects with a ``dot_number`` attribute)
+        seen: Optional set of DOT numbers already emitted. It is updated in place,
+              which lets callers deduplicate across successive batches.
+    """
+    if seen is None:
+        seen = set()
     unique_records = []
     
     for record in records:
-        dot_number = record.get("dot_number")
+        dot_number = record.dot_number
         if dot_number and dot_number not in seen:
             seen.add(dot_number)
             unique_records.append(record)
@@ -62,3 +143,121 @@ def deduplicate_by_dot_number(records: List[Dict]) -> List[Dict]:
     
     logger.info(f"Deduplicated {len(records)} records to {len(unique_records)} unique records")
     return unique_records
+
+
+class TokenBucket:
+    """Thread-safe token bucket used to cap client-side request rates"""
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        """
+        Initialize the bucket (starts full)
+        
+        Args:
+            rate: Tokens added per second
+            capacity: Maximum burst size. Defaults to max(1, rate).
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def acquire(self, tokens: float = 1.0) -> None:
+        """Block until ``tokens`` are available, then consume them"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                wait = (tokens - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    Parse a Retry-After header value into seconds
+    
+    Args:
+        value: Header value (delay in seconds or an HTTP date)
+    
+    Returns:
+        Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, base: float, cap: float, retry_after: Optional[float] = None) -> float:
+    """
+    Compute a jittered exponential backoff delay
+    
+    Args:
+        attempt: Zero-based retry attempt
+        base: Base delay in seconds
+        cap: Maximum delay in seconds
+        retry_after: Server-requested delay, which takes precedence when given
+    
+    Returns:
+        Seconds to sleep before the next attempt
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, base)
+    # "Full jitter": spread retries uniformly over the exponential window
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def call_with_retry(request: Callable, http_error: type, max_retries: int, base: float, cap: float,
+                    rate_limiter: Optional[TokenBucket] = None, description: str = "Request"):
+    """
+    Run one API request, retrying throttling and transient failures
+    
+    HTTP errors with a status in RETRYABLE_STATUS_CODES, connection errors
+    and timeouts are retried with jittered exponential backoff, waiting at
+    least as long as any Retry-After header asks. Other HTTP errors are
+    raised immediately.
+    
+    Args:
+        request: Zero-argument callable performing the request
+        http_error: Exception type the client raises for HTTP errors (must carry ``response``)
+        max_retries: Retries before giving up
+        base: Base backoff delay in seconds
+        cap: Maximum backoff delay in seconds
+        rate_limiter: Optional TokenBucket acquired before every attempt
+        description: Name of the request used in log messages
+    
+    Returns:
+        Whatever the request returns
+    """
+    attempt = 0
+    while True:
+        if rate_limiter:
+            rate_limiter.acquire()
+        try:
+            return request()
+        except (http_error, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            response = getattr(e, "response", None)
+            status = response.status_code if response is not None else None
+            if isinstance(e, http_error) and status not in RETRYABLE_STATUS_CODES:
+                raise
+            if attempt >= max_retries:
+                logger.error(f"Giving up on {description} after {attempt} retries: {str(e)}")
+                raise
+            
+            retry_after = parse_retry_after(response.headers.get("Retry-After")) if response is not None else None
+            delay = backoff_delay(attempt, base, cap, retry_after)
+            attempt += 1
+            logger.warning(f"{description} failed ({status or type(e).__name__}); "
+                           f"retry {attempt}/{max_retries} in {delay:.1f}s")
+            time.sleep(delay)